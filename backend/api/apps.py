@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+
+
+class ApiConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        from .shopping_list import register_fonts
+        register_fonts()
+        if settings.DB_CONN_HEALTH_CHECKS:
+            from foodgram_project.db import (close_unusable_connections,
+                                             mark_connections_idle)
+            request_started.connect(close_unusable_connections)
+            request_finished.connect(mark_connections_idle)
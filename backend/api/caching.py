@@ -0,0 +1,87 @@
+"""
+Условные GET-запросы (ETag) и заголовки Cache-Control.
+ETag строится из счетчиков версий recipes.versions, поэтому
+ответ 304 отдается без запросов к базе и без сериализации.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from recipes.models import Recipe
+from recipes.search import ingredient_index
+from recipes.tags import tag_registry
+from recipes.versions import (INGREDIENTS_KEY, RECIPE_KEY, TAGS_KEY, USER_KEY,
+                              VIEWER_KEY, get_versions)
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def tags_etag(request, *args, **kwargs):
+    # Версия, с которой реестр отдаст теги в этом же запросе.
+    return make_etag(tag_registry.current_version(), *kwargs.values())
+
+
+def ingredients_etag(request, *args, **kwargs):
+    # Версия, с которой индекс отдаст продукты в этом же запросе.
+    return make_etag(
+        ingredient_index.current_version(),
+        settings.INGREDIENT_SEARCH_MODE,
+        settings.INGREDIENT_SEARCH_LIMIT,
+        *kwargs.values()
+    )
+
+
+def recipe_etag(request, pk, *args, **kwargs):
+    """
+    Версия рецепта, его автора, тегов и продуктов, а для
+    авторизованного пользователя - еще и его избранного,
+    корзины и подписок.
+    """
+    try:
+        author_id = Recipe.objects.filter(pk=int(pk)).values_list(
+            'author_id', flat=True).first()
+    except ValueError:
+        return None
+    if author_id is None:
+        return None
+    keys = [RECIPE_KEY.format(pk), USER_KEY.format(author_id),
+            TAGS_KEY, INGREDIENTS_KEY]
+    user = request.user
+    if user.is_authenticated:
+        keys.append(VIEWER_KEY.format(user.id))
+    return make_etag(*get_versions(*keys), user.id)
+
+
+def conditional_get(etag_func, max_age, private=False):
+    """
+    Декоратор метода вьюсета: при совпадении If-None-Match
+    возвращает 304, не вызывая метод. Ответы с данными конкретного
+    пользователя (private) не кешируются общими кешами.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag = etag_func(request, *args, **kwargs)
+            if etag is None:
+                return method(self, request, *args, **kwargs)
+            etag = quote_etag(etag)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            if private and request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, max_age=max_age)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+"""
+Поле картинки, переданной строкой data:image/...;base64,...
+Строка декодируется частями во временный файл, который остается
+в памяти до FILE_UPLOAD_MAX_MEMORY_SIZE и затем переносится на диск,
+поэтому копия строки и все декодированные байты в памяти не держатся.
+Копируется только строка с переносами и пробелами, которые многие
+клиенты вставляют в base64: из нее они удаляются до декодирования.
+"""
+
+import binascii
+import re
+from base64 import b64decode
+from tempfile import SpooledTemporaryFile
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image
+from recipes.images import rendition_urls
+from rest_framework import serializers
+
+BASE64_MARKER = ';base64,'
+WHITESPACE = re.compile(r'\s')
+# Кратно 4 символам base64, чтобы части декодировались независимо.
+CHUNK_SIZE = 64 * 1024
+# Сигнатуры поддерживаемых форматов и расширения файлов.
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'RIFF', 'webp'),
+)
+
+
+def detect_extension(header):
+    for signature, extension in SIGNATURES:
+        if header.startswith(signature):
+            if extension == 'webp' and header[8:12] != b'WEBP':
+                continue
+            return extension
+    return None
+
+
+def decoded_size(data, start):
+    """Размер декодированных данных без декодирования."""
+    length = len(data) - start
+    if length % 4:
+        raise serializers.ValidationError(
+            'Некорректная строка base64.', code='invalid')
+    padding = 0
+    if length and data[-1] == '=':
+        padding = 2 if data[-2] == '=' else 1
+    return length // 4 * 3 - padding
+
+
+def decode_base64_image(data, max_size):
+    """
+    Декодирует картинку из data URL во временный файл.
+    Размер проверяется до декодирования, формат - по первой части.
+    """
+    marker = data.find(BASE64_MARKER)
+    if marker == -1:
+        raise serializers.ValidationError(
+            'Некорректная строка base64.', code='invalid')
+    start = marker + len(BASE64_MARKER)
+    if WHITESPACE.search(data, start):
+        data, start = WHITESPACE.sub('', data[start:]), 0
+    size = decoded_size(data, start)
+    if size > max_size:
+        raise serializers.ValidationError(
+            'Размер картинки больше {} байт.'.format(max_size),
+            code='max_size')
+    file = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    extension = None
+    try:
+        for position in range(start, len(data), CHUNK_SIZE):
+            chunk = b64decode(
+                data[position:position + CHUNK_SIZE], validate=True)
+            if extension is None:
+                extension = detect_extension(chunk)
+                if extension is None:
+                    raise serializers.ValidationError(
+                        'Неподдерживаемый формат картинки.', code='format')
+            file.write(chunk)
+    except binascii.Error:
+        file.close()
+        raise serializers.ValidationError(
+            'Некорректная строка base64.', code='invalid')
+    except serializers.ValidationError:
+        file.close()
+        raise
+    if extension is None:
+        file.close()
+        raise serializers.ValidationError(
+            'Картинка не передана.', code='empty')
+    file.seek(0)
+    image = File(file, name='image.' + extension)
+    image.size = size
+    return image
+
+
+class FileImageField(forms.ImageField):
+    """
+    Проверяет картинку Pillow прямо по файловому объекту,
+    без копирования содержимого в BytesIO.
+    """
+
+    def to_python(self, data):
+        f = forms.FileField.to_python(self, data)
+        if f is None or hasattr(data, 'temporary_file_path'):
+            return super().to_python(data)
+        try:
+            data.seek(0)
+            image = Image.open(data)
+            image.verify()
+            f.image = image
+            f.content_type = Image.MIME.get(image.format)
+        except Exception as exc:
+            raise ValidationError(
+                self.error_messages['invalid_image'],
+                code='invalid_image',
+            ) from exc
+        f.seek(0)
+        return f
+
+
+class Base64ImageField(serializers.ImageField):
+    """
+    max_size ограничивает размер файла, max_pixels - размер
+    картинки после распаковки, который по файлу не виден.
+    """
+    default_error_messages = {
+        'max_pixels': 'Картинка больше {max_pixels} пикселей.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('_DjangoImageField', FileImageField)
+        self.max_size = kwargs.pop('max_size', settings.IMAGE_MAX_SIZE)
+        self.max_pixels = kwargs.pop(
+            'max_pixels', settings.IMAGE_MAX_PIXELS)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = decode_base64_image(data, self.max_size)
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > self.max_pixels:
+            self.fail('max_pixels', max_pixels=self.max_pixels)
+        return file
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки рецепта по их названиям."""
+
+    def to_representation(self, image):
+        urls = rendition_urls(image)
+        request = self.context.get('request')
+        if request is None:
+            return urls
+        return {
+            rendition: request.build_absolute_uri(url)
+            for rendition, url in urls.items()
+        }
@@ -5,25 +5,47 @@
 from django_filters import CharFilter
 from django_filters import rest_framework as django_filter
 from recipes.models import Ingredient, Recipe
+from recipes.tags import tag_registry
 from users.models import User
 
+POPULAR = 'popular'
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_registry.slug_map()]
+
 
 class RecipeFilter(django_filter.FilterSet):
     """
     Настройка фильтров модели рецептов.
     """
     author = django_filter.ModelChoiceFilter(queryset=User.objects.all())
-    tags = django_filter.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filter.MultipleChoiceFilter(
+        choices=get_tag_choices, method='get_tags')
     is_favorited = django_filter.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = django_filter.BooleanFilter(
         method='get_is_in_shopping_cart')
+    ordering = django_filter.ChoiceFilter(
+        choices=((POPULAR, POPULAR),), method='get_ordering')
 
     class Meta:
         """
         Мета параметры фильтров модели рецептов.
         """
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
+
+    def get_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов. Слаги переводятся в id
+        по реестру тегов, отбор делается подзапросом id__in
+        без соединения с тегами, поэтому рецепты не дублируются.
+        """
+        tag_map = tag_registry.slug_map()
+        return queryset.filter(id__in=Recipe.tags.through.objects.filter(
+            tag_id__in=[tag_map[slug] for slug in value if slug in tag_map]
+        ).values('recipe_id'))
 
     def get_is_favorited(self, queryset, name, value):
         """
@@ -41,6 +63,16 @@ class RecipeFilter(django_filter.FilterSet):
             return queryset.filter(shopping_carts__user=self.request.user)
         return queryset.all()
 
+    def get_ordering(self, queryset, name, value):
+        """
+        Сортировка по популярности из RecipeRanking. Отбор по наличию
+        строки дает INNER JOIN, и PostgreSQL может читать рецепты
+        в порядке индекса recipe_ranking_score_idx.
+        Постраничный вывод по cursor всегда идет по дате публикации.
+        """
+        return queryset.filter(ranking__isnull=False).order_by(
+            '-ranking__score', '-id')
+
 
 class IngredientSearchFilter(django_filter.FilterSet):
     """
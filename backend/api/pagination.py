@@ -1,4 +1,20 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from recipes.feed import filter_feed
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPagePagination(PageNumberPagination):
@@ -9,3 +25,276 @@ class LimitPagePagination(PageNumberPagination):
     """
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class CachedCountPage(Page):
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that fetches the page without knowing the total:
+    one query of per_page + 1 rows answers has_next, and count
+    is only resolved afterwards, by count_func.
+    """
+    def __init__(self, object_list, per_page, count_func, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_func = count_func
+        self.min_count = 0
+
+    @cached_property
+    def count(self):
+        return max(self.count_func(), self.min_count)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('That page contains no results')
+        page = self._get_page(objects[:self.per_page], number, self)
+        page.has_more = len(objects) > self.per_page
+        if page.has_more:
+            self.min_count = bottom + len(objects)
+        else:
+            # The last page tells the exact total.
+            self.count = bottom + len(objects)
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return CachedCountPage(*args, **kwargs)
+
+
+class CachedCountPagination(LimitPagePagination):
+    """
+    Page number paginator whose count does not run COUNT(*)
+    on every request:
+    the count is cached for count_cache_timeout seconds under
+    a key built from the path and the normalized filter params,
+    for unfiltered lists on PostgreSQL the planner estimate
+    (pg_class.reltuples) is used when count_estimate is set.
+    Any of the count_* attributes can be overridden on the view.
+    The page itself is fetched before and independently of the count.
+    """
+    count_cache_timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+    count_estimate = True
+    count_estimate_threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+    count_user_params = ()
+    count_ignored_params = ('page', 'limit', 'format')
+
+    def get_option(self, name):
+        return getattr(self.view, name, getattr(self, name))
+
+    def get_filter_params(self, request):
+        ignored = self.get_option('count_ignored_params')
+        return sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+            if key not in ignored
+        )
+
+    def get_count_cache_key(self, request, params):
+        parts = [request.path, params]
+        user_params = self.get_option('count_user_params')
+        if any(key in user_params for key, _ in params):
+            parts.append(request.user.pk)
+        return 'count:{}'.format(
+            hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def estimate_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        estimate = int(row[0])
+        # Small tables are cheap to count and poorly estimated.
+        if estimate < self.get_option('count_estimate_threshold'):
+            return None
+        return estimate
+
+    def get_count(self, queryset, request):
+        params = self.get_filter_params(request)
+        timeout = self.get_option('count_cache_timeout')
+        key = self.get_count_cache_key(request, params)
+        count = cache.get(key) if timeout else None
+        if count is not None:
+            return count
+        if not params and self.get_option('count_estimate'):
+            count = self.estimate_count(queryset)
+        if count is None:
+            count = queryset.count()
+        if timeout:
+            cache.set(key, count, timeout)
+        return count
+
+    def django_paginator_class(self, queryset, page_size):
+        return CachedCountPaginator(
+            queryset, page_size,
+            lambda: self.get_count(queryset, self.request)
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.view = view
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset paginator ordered by (-pub_date, -id):
+    cursor - opaque position from the next/previous links,
+    an empty value requests the first page
+    limit - The number of objects on the page.
+    Each page is one indexed range query of limit + 1 rows,
+    without COUNT(*) and OFFSET.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def encode_cursor(self, obj, reverse):
+        position = '{}|{}|{}'.format(
+            obj.pub_date.isoformat(), obj.id, int(reverse))
+        return b64encode(position.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, id, reverse = b64decode(
+                encoded.encode()).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            id, reverse = int(id), bool(int(reverse))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, id, reverse
+
+    def apply_cursor(self, queryset, cursor, fields=('pub_date', 'id')):
+        """
+        Rows after the cursor in page order: descending for next pages,
+        ascending for previous pages. fields are the date and id fields
+        of the queryset model.
+        """
+        date_field, id_field = fields
+        if cursor is None:
+            return queryset.order_by('-' + date_field, '-' + id_field)
+        pub_date, id, reverse = cursor
+        lookup = 'gt' if reverse else 'lt'
+        queryset = queryset.filter(
+            Q(**{'{}__{}'.format(date_field, lookup): pub_date})
+            | Q(**{date_field: pub_date,
+                   '{}__{}'.format(id_field, lookup): id})
+        )
+        if reverse:
+            return queryset.order_by(date_field, id_field)
+        return queryset.order_by('-' + date_field, '-' + id_field)
+
+    def get_page_queryset(self, queryset, cursor, page_size):
+        """Queryset of the page, sliced to page_size + 1 rows by caller."""
+        return self.apply_cursor(queryset, cursor)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+        queryset = self.get_page_queryset(queryset, cursor, page_size)
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = bool(page), has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def get_link(self, obj, reverse):
+        url = self.request.build_absolute_uri()
+        if obj is None:
+            return replace_query_param(url, self.cursor_query_param, '')
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.get_link(None, reverse=True)
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Keyset pagination of the following feed of the request user:
+    the cursor is applied to every feed source before the recipes query,
+    see recipes.feed.
+    """
+
+    def get_page_queryset(self, queryset, cursor, page_size):
+        queryset = filter_feed(
+            queryset, self.request.user,
+            partial(self.apply_cursor, cursor=cursor), page_size + 1)
+        return self.apply_cursor(queryset, cursor)
+
+
+class LimitPageOrKeysetPagination(CachedCountPagination):
+    """
+    Page number pagination with a cached count by default, keyset pagination
+    when the request has the cursor parameter.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_pagination_class.cursor_query_param in (
+                request.query_params):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,72 @@
+"""
+Рендереры форматов выгрузки списка покупок.
+"""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .shopping_list import iter_csv, iter_json, iter_text, render_pdf
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Сам список строится функцией из SHOPPING_LIST_DOCUMENTS или
+    отдается потоком функцией из SHOPPING_LIST_STREAMS по format
+    рендерера, а render() используется только для ответов с ошибками
+    и выводит их в JSON, как остальной API.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+# PDF идет первым и выбирается, если клиент не указал формат.
+SHOPPING_LIST_RENDERERS = (
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+)
+
+# Файлы списка покупок по format рендерера: документы целиком
+# и генераторы частей для потоковой выдачи.
+SHOPPING_LIST_DOCUMENTS = {
+    PDFShoppingListRenderer.format: render_pdf,
+}
+SHOPPING_LIST_STREAMS = {
+    TextShoppingListRenderer.format: iter_text,
+    CSVShoppingListRenderer.format: iter_csv,
+    JSONShoppingListRenderer.format: iter_json,
+}
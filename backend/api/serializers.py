@@ -1,31 +1,50 @@
-import base64
-
-from django.core.files.base import ContentFile
-from recipes.models import (Favorite, Ingredient, Recipe,
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from PIL import Image
+from recipes.images import process_original
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
                             RecipeIngredientDetails, ShoppingCart, Tag)
+from recipes.tags import tag_registry
+from recipes.versions import bump_recipe_shopping_lists, deferred_bumps
 from rest_framework import serializers
 from users.serializers import CustomUserSerializers
 
-
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
+from .fields import Base64ImageField, ImageRenditionsField
 
 
 class TagSerializer(serializers.ModelSerializer):
-    """Сериализация данных тегов."""
+    """Сериализация данных тегов, данные берутся из реестра тегов."""
 
     class Meta:
         fields = ('id', 'name', 'color', 'slug')
         model = Tag
         lookup_field = 'id'
 
+    def to_representation(self, instance):
+        data = tag_registry.get(instance.pk)
+        if data is None:
+            return super().to_representation(instance)
+        return dict(data)
+
+
+class TagPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Тег по id из реестра тегов, без запроса к базе данных."""
+
+    def get_queryset(self):
+        return Tag.objects.all()
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        tag = tag_registry.get_instance(pk)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализация ингредиентов."""
@@ -39,11 +58,12 @@ class FavoriteSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = serializers.ImageField(source='recipe.image')
+    image_renditions = ImageRenditionsField(source='recipe.image')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
@@ -51,11 +71,12 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = serializers.ImageField(source='recipe.image')
+    image_renditions = ImageRenditionsField(source='recipe.image')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
         model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
@@ -74,25 +95,43 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeAuthorSerializer(CustomUserSerializers):
+    """
+    Автор рецепта, подписка на него берется из аннотации
+    is_subscribed рецепта, если она есть.
+    """
+
+    def get_attribute(self, instance):
+        author = super().get_attribute(instance)
+        if hasattr(instance, 'is_subscribed'):
+            author.is_subscribed = instance.is_subscribed
+        return author
+
+
 class RecipeListSerializer(serializers.ModelSerializer):
-    author = CustomUserSerializers(read_only=True)
+    author = RecipeAuthorSerializer(read_only=True)
     ingredients = IngredientRecipeSerializer(source='ingredient_amount',
                                              many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_renditions = ImageRenditionsField(source='image')
 
     def get_ingredients(self, obj):
         queryset = RecipeIngredientDetails.objects.filter(recipe=obj)
         return IngredientRecipeSerializer(queryset, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user.id, recipe=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -112,36 +151,70 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time'
         )
 
 
+class IngredientCreateListSerializer(serializers.ListSerializer):
+    """
+    Продукты всех строк проверяются одним запросом id__in,
+    в ошибке перечисляются все несуществующие продукты.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {item['id'] for item in items})
+        errors = [
+            {} if item['id'] in ingredients else {'id': [
+                'Продукт с id={} не существует.'.format(item['id'])]}
+            for item in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        for item in items:
+            item['id'] = ingredients[item['id']]
+        return items
+
+
 class IngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredientDetails
         fields = ('id', 'amount')
+        list_serializer_class = IngredientCreateListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializers(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
-    )
+    tags = TagPrimaryKeyRelatedField(many=True)
     ingredients = IngredientCreateSerializer(many=True)
     image = Base64ImageField()
 
     def to_representation(self, instance):
-        request = self.context.get('request')
-        serializer = RecipeListSerializer(
-            instance,
-            context={'request': request}
-        )
+        # После записи продукты рецепта загружаются одним запросом.
+        prefetch_related_objects([instance], Prefetch(
+            'ingredient_amount',
+            queryset=RecipeIngredientDetails.objects.select_related(
+                'ingredient')
+        ))
+        serializer = RecipeListSerializer(instance, context=self.context)
         return serializer.data
 
+    def validate_image(self, image):
+        """
+        Картинка уменьшается и перекодируется здесь, а не при сохранении:
+        Image.verify() пропускает, например, обрезанный JPEG, и ошибка
+        декодирования должна стать ошибкой валидации.
+        """
+        try:
+            return process_original(image)
+        except (OSError, Image.DecompressionBombError):
+            self.fields['image'].fail('invalid_image')
+
     def validate(self, data):
         ingredient_data = self.initial_data.get('ingredients')
         checked_ingredients = []
@@ -162,25 +235,64 @@ class RecipeSerializer(serializers.ModelSerializer):
         ) for ingredient in ingredients]
         RecipeIngredientDetails.objects.bulk_create(ingredients_list)
 
+    def set_ingredients(self, ingredients, recipe):
+        """
+        Изменяет только отличающиеся строки продуктов рецепта:
+        новые количества - одним bulk_update, новые продукты -
+        одним bulk_create, удаленные - одним запросом DELETE.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredientDetails.objects.filter(recipe=recipe)
+        }
+        submitted = {
+            ingredient['id'].id: ingredient for ingredient in ingredients}
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = submitted.get(ingredient_id, {}).get('amount')
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredientDetails.objects.bulk_update(changed, ['amount'])
+        removed = [
+            row.id for ingredient_id, row in current.items()
+            if ingredient_id not in submitted
+        ]
+        if removed:
+            RecipeIngredientDetails.objects.filter(id__in=removed).delete()
+        self.add_ingredients(
+            [ingredient for ingredient_id, ingredient in submitted.items()
+             if ingredient_id not in current],
+            recipe
+        )
+
     def add_tags(self, tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+        recipe.tags.add(*tags)
 
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        self.add_tags(tags, recipe)
-        self.add_ingredients(ingredients, recipe)
+        with transaction.atomic(), deferred_bumps():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            self.add_tags(tags, recipe)
+            self.add_ingredients(ingredients, recipe)
+            FeedEntry.objects.fan_out(recipe.id)
         return recipe
 
     def update(self, recipe, validated_data):
-        recipe.tags.clear()
-        RecipeIngredientDetails.objects.filter(recipe=recipe).delete()
-        self.add_tags(validated_data.pop('tags'), recipe)
-        self.add_ingredients(validated_data.pop('ingredients'), recipe)
-        return super().update(recipe, validated_data)
+        # Сигналы удаления продуктов рецепта сбрасывают кеши
+        # один раз на рецепт, а не на каждую строку.
+        with transaction.atomic(), deferred_bumps():
+            if 'tags' in validated_data:
+                recipe.tags.set(validated_data.pop('tags'))
+            if 'ingredients' in validated_data:
+                self.set_ingredients(
+                    validated_data.pop('ingredients'), recipe)
+                # bulk_update и bulk_create не отправляют сигналы,
+                # списки покупок с этим рецептом сбрасываются явно.
+                bump_recipe_shopping_lists(recipe.id)
+            return super().update(recipe, validated_data)
 
     class Meta:
         model = Recipe
@@ -0,0 +1,149 @@
+"""
+Формирование списка покупок пользователя.
+"""
+
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from recipes.models import RecipeIngredientDetails
+from recipes.versions import INGREDIENTS_KEY, SHOPPING_LIST_KEY, get_versions
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+FONT_NAME = 'arial'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'arial.ttf')
+PAGE_TOP = 790
+PAGE_BOTTOM = 40
+ROW_HEIGHT = 25
+COLUMNS = ('Название', 'Количество', 'Единица измерения')
+
+
+def register_fonts():
+    """
+    Регистрирует шрифт один раз при запуске приложения.
+    """
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def get_shopping_list(user):
+    """
+    Суммарное количество каждого ингредиента из корзины покупок.
+    """
+    return RecipeIngredientDetails.objects.filter(
+        recipe__shopping_carts__user=user).values(
+            'ingredient__name',
+            'ingredient__measurement_unit').order_by(
+                'ingredient__name').annotate(amount=Sum('amount'))
+
+
+def get_cache_prefix(user):
+    """
+    Префикс ключей кеша для текущей версии списка покупок пользователя.
+    """
+    versions = get_versions(SHOPPING_LIST_KEY.format(user.id), INGREDIENTS_KEY)
+    return 'shopping_list:{}:{}:{}'.format(user.id, *versions)
+
+
+def get_cached_shopping_list(user, prefix):
+    key = f'{prefix}:rows'
+    ingredients = cache.get(key)
+    if ingredients is None:
+        ingredients = list(get_shopping_list(user))
+        cache.set(key, ingredients, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return ingredients
+
+
+def cache_stream(chunks, key):
+    """
+    Отдает части ответа и после последней сохраняет весь ответ в кеш.
+    """
+    content = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        content.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(content), settings.SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def draw_columns(canvas, height):
+    canvas.setFont(FONT_NAME, size=16)
+    for x, column in zip((60, 220, 350), COLUMNS):
+        canvas.drawString(x, height, f'{column}:')
+    return height - 40
+
+
+def render_pdf(ingredients):
+    """
+    PDF-документ со списком покупок, строки переносятся
+    на новую страницу по достижении нижнего поля.
+    reportlab собирает документ в памяти целиком, поэтому PDF
+    отдается обычным ответом, а не потоком.
+    """
+    canvas = Canvas(None)
+    canvas.setFont(FONT_NAME, 32)
+    canvas.drawString(60, PAGE_TOP, 'Продуктовый помощник')
+    canvas.drawString(60, 750, 'список покупок:')
+    canvas.setFont(FONT_NAME, size=18)
+    canvas.drawString(60, 690, 'Ингредиенты:')
+    height = draw_columns(canvas, 660)
+    for ingredient in ingredients:
+        if height < PAGE_BOTTOM:
+            canvas.showPage()
+            height = draw_columns(canvas, PAGE_TOP)
+        canvas.drawString(60, height, f"{ingredient['ingredient__name']}")
+        canvas.drawString(250, height, f"{ingredient['amount']}")
+        canvas.drawString(
+            380, height, f"{ingredient['ingredient__measurement_unit']}")
+        height -= ROW_HEIGHT
+    canvas.showPage()
+    return canvas.getpdfdata()
+
+
+def iter_text(ingredients):
+    """
+    Список покупок простым текстом, по строке на ингредиент.
+    """
+    for ingredient in ingredients:
+        yield (f"{ingredient['ingredient__name']} "
+               f"({ingredient['ingredient__measurement_unit']}) — "
+               f"{ingredient['amount']}\n")
+
+
+class Echo:
+    """
+    Объект с методом write для csv.writer, возвращающий строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def iter_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
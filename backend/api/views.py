@@ -1,27 +1,31 @@
-import io
-
-import reportlab
 from django.conf import settings
-from django.db.models import Sum
-from django.http import FileResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import (Favorite, Ingredient, Recipe,
                             RecipeIngredientDetails, ShoppingCart, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen.canvas import Canvas
+from recipes.search import ingredient_index
+from recipes.tags import tag_registry
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from users.models import Follow
 
+from .caching import conditional_get, ingredients_etag, recipe_etag, tags_etag
 from .filters import IngredientSearchFilter, RecipeFilter
-from .pagination import LimitPagePagination
+from .pagination import FeedPagination, LimitPageOrKeysetPagination
 from .permissions import AuthorOrReadOnly
+from .renderers import (SHOPPING_LIST_DOCUMENTS, SHOPPING_LIST_RENDERERS,
+                        SHOPPING_LIST_STREAMS)
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeSerializer, ShoppingCartSerializer,
                           TagSerializer)
+from .shopping_list import (cache_stream, get_cache_prefix,
+                            get_cached_shopping_list)
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -36,6 +40,21 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_class = IngredientSearchFilter
     pagination_class = None
 
+    @conditional_get(ingredients_etag, settings.REFERENCE_CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        """
+        Список и поиск по названию обслуживаются
+        индексом в памяти без обращения к базе данных.
+        """
+        return Response(
+            ingredient_index.autocomplete(
+                request.query_params.get('name', ''))
+        )
+
+    @conditional_get(ingredients_etag, settings.REFERENCE_CACHE_MAX_AGE)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -46,6 +65,37 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     serializer_class = TagSerializer
 
+    @conditional_get(tags_etag, settings.REFERENCE_CACHE_MAX_AGE)
+    def list(self, request, *args, **kwargs):
+        """
+        Теги отдаются из реестра в памяти процесса.
+        """
+        return Response(tag_registry.all())
+
+    @conditional_get(tags_etag, settings.REFERENCE_CACHE_MAX_AGE)
+    def retrieve(self, request, pk, *args, **kwargs):
+        try:
+            tag = tag_registry.get(int(pk))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise Http404
+        return Response(tag)
+
+
+RECIPE_FETCH_PLAN = {
+    'select_related': ('author',),
+    'prefetch_related': (
+        # Данные тегов берутся из реестра, из базы нужны только id.
+        Prefetch('tags', queryset=Tag.objects.only('id')),
+        Prefetch(
+            'ingredient_amount',
+            queryset=RecipeIngredientDetails.objects.select_related(
+                'ingredient')
+        ),
+    ),
+}
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
@@ -58,15 +108,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend, )
     filter_class = RecipeFilter
-    pagination_class = LimitPagePagination
+    pagination_class = LimitPageOrKeysetPagination
+    count_user_params = ('is_favorited', 'is_in_shopping_cart')
+    # Сортировка не меняет число рецептов.
+    count_ignored_params = ('page', 'limit', 'format', 'ordering')
+    fetch_plans = {
+        'list': RECIPE_FETCH_PLAN,
+        'retrieve': RECIPE_FETCH_PLAN,
+        'feed': RECIPE_FETCH_PLAN,
+    }
+
+    def get_queryset(self):
+        """
+        Связанные объекты загружаются по плану текущего действия.
+        Флаги is_favorited, is_in_shopping_cart и подписка на автора
+        is_subscribed вычисляются подзапросами EXISTS в том же запросе,
+        что и рецепты.
+        Обновляемый рецепт блокируется до конца транзакции.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('update', 'partial_update'):
+            queryset = queryset.select_for_update()
+        plan = self.fetch_plans.get(self.action, {})
+        if plan.get('select_related'):
+            queryset = queryset.select_related(*plan['select_related'])
+        if plan.get('prefetch_related'):
+            queryset = queryset.prefetch_related(*plan['prefetch_related'])
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    @conditional_get(
+        recipe_etag, settings.RECIPE_CACHE_MAX_AGE, private=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
-    @staticmethod
-    def create_object(request, pk, serializers):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        """
+        Чтение, проверка и запись рецепта выполняются в одной
+        транзакции под блокировкой строки рецепта.
+        """
+        return super().update(request, *args, **kwargs)
+
+    def add_or_remove(self, request, pk, model, serializer_class, messages):
+        """
+        Добавление - один INSERT ... ON CONFLICT DO NOTHING,
+        удаление - один DELETE, рецепт заранее не загружается.
+        Статус ответа определяется числом измененных строк.
+        """
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        user = request.user
+        if request.method == 'POST':
+            if model.objects.add(user.id, recipe_id):
+                instance = model(
+                    user=user, recipe=Recipe.objects.get(pk=recipe_id))
+                return Response(
+                    serializer_class(
+                        instance, context={'request': request}).data,
+                    status=status.HTTP_201_CREATED
+                )
+            error = messages['exists']
+        else:
+            if model.objects.remove(user.id, recipe_id):
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            error = messages['missing']
+        get_object_or_404(Recipe.objects.only('id'), pk=recipe_id)
+        return Response(
+            {'errors': error}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок пользователя, новые первыми.
+        Страницы только по курсору (pub_date, id), без OFFSET и count.
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -74,29 +212,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def favorite(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-        if request.method == 'POST':
-            favorite_recipe, created = Favorite.objects.get_or_create(
-                user=user, recipe=recipe
-            )
-            if created is True:
-                serializer = FavoriteSerializer()
-                return Response(
-                    serializer.to_representation(instance=favorite_recipe),
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                {'errors': 'Рецепт уже добавлен в избранное'},
-                status=status.HTTP_201_CREATED
-            )
-        if request.method == 'DELETE':
-            Favorite.objects.filter(
-                user=user,
-                recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return self.add_or_remove(
+            request, pk, Favorite, FavoriteSerializer, {
+                'exists': 'Рецепт уже добавлен в избранное',
+                'missing': 'Рецепта нет в избранном',
+            }
+        )
 
     @action(
         detail=True,
@@ -104,62 +225,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-        if request.method == 'POST':
-            recipe, created = ShoppingCart.objects.get_or_create(
-                user=user, recipe=recipe
-            )
-            if created is True:
-                serializer = ShoppingCartSerializer()
-                return Response(
-                    serializer.to_representation(instance=recipe),
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                {'errors': 'Рецепт уже в корзине покупок'},
-                status=status.HTTP_201_CREATED
-            )
-        if request.method == 'DELETE':
-            ShoppingCart.objects.filter(
-                user=user, recipe=recipe
-            ).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
-
-    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+        return self.add_or_remove(
+            request, pk, ShoppingCart, ShoppingCartSerializer, {
+                'exists': 'Рецепт уже в корзине покупок',
+                'missing': 'Рецепта нет в корзине покупок',
+            }
+        )
+
+    @action(
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = RecipeIngredientDetails.objects.filter(
-            recipe__shopping_carts__user=user).values(
-                'ingredient__name',
-                'ingredient__measurement_unit').order_by(
-                    'ingredient__name').annotate(amount=Sum('amount'))
-        buffer = io.BytesIO()
-        canvas = Canvas(buffer)
-        reportlab.rl_config.TTFSearchPath.append(
-            str(settings.BASE_DIR) + '/backend')
-        pdfmetrics.registerFont(
-            TTFont('arial', 'arial.ttf', 'UTF-8'))
-        canvas.setFont('arial', 32)
-        canvas.drawString(60, 790, 'Продуктовый помощник')
-        canvas.drawString(60, 750, 'список покупок:')
-        canvas.setFont('arial', size=18)
-        canvas.drawString(60, 690, 'Ингредиенты:')
-        canvas.setFont('arial', size=16)
-        canvas.drawString(60, 660, 'Название:')
-        canvas.drawString(220, 660, 'Количество:')
-        canvas.drawString(350, 660, 'Единица измерения:')
-        height = 620
-        for ingredient in ingredients:
-            canvas.drawString(60, height, f"{ingredient['ingredient__name']}")
-            canvas.drawString(250, height,
-                              f"{ingredient['amount']}")
-            canvas.drawString(380, height,
-                              f"{ingredient['ingredient__measurement_unit']}")
-            height -= 25
-        canvas.showPage()
-        canvas.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
-                            filename='shopping_cart.pdf')
+        """
+        Выгрузка списка покупок в формате из параметра format
+        (pdf, txt, csv, json) или заголовка Accept, по умолчанию PDF.
+        Готовый файл кешируется до изменения корзины или ее рецептов.
+        """
+        renderer = request.accepted_renderer
+        prefix = get_cache_prefix(request.user)
+        key = f'{prefix}:{renderer.format}'
+        content = cache.get(key)
+        if content is None and renderer.format in SHOPPING_LIST_DOCUMENTS:
+            content = SHOPPING_LIST_DOCUMENTS[renderer.format](
+                get_cached_shopping_list(request.user, prefix))
+            cache.set(key, content, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+        if content is not None:
+            response = HttpResponse(
+                content, content_type=renderer.content_type)
+        else:
+            ingredients = get_cached_shopping_list(request.user, prefix)
+            response = StreamingHttpResponse(
+                cache_stream(
+                    SHOPPING_LIST_STREAMS[renderer.format](ingredients), key),
+                content_type=renderer.content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
+        return response
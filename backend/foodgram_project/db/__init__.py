@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def mark_connections_idle(**kwargs):
+    """Запоминает, с какого момента постоянные соединения не используются."""
+    now = time.monotonic()
+    for connection in connections.all():
+        connection.idle_since = now
+
+
+def close_unusable_connections(**kwargs):
+    """
+    Закрывает постоянные соединения, переставшие отвечать,
+    до того как запрос попытается их использовать. Проверяются
+    только соединения, простоявшие без запросов не меньше
+    DB_CONN_HEALTH_CHECK_IDLE секунд, чтобы не тратить на проверку
+    лишний запрос к базе в каждом запросе к API.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        idle_since = getattr(connection, 'idle_since', now)
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and now - idle_since >= settings.DB_CONN_HEALTH_CHECK_IDLE
+                and not connection.is_usable()):
+            connection.close()
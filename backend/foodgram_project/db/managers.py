@@ -0,0 +1,35 @@
+from django.db import connections, models
+from django.db.models.signals import post_delete, post_save
+
+
+class RawSQLManager(models.Manager):
+    """
+    Менеджер для записи одним SQL-запросом в обход ORM.
+    В тексте запроса {table} - таблица модели менеджера, остальные
+    таблицы задаются в tables как {имя: модель}.
+    Такие запросы не отправляют сигналы post_save и post_delete,
+    поэтому подклассы отправляют их через send_created и send_deleted
+    в той же транзакции: по сигналам сбрасываются зависящие
+    от записей кеши и меняются счетчики.
+    """
+    tables = {}
+
+    def execute(self, sql, params, **names):
+        """Выполняет запрос и возвращает число измененных строк."""
+        connection = connections[self.db]
+        tables = {'table': self.model, **self.tables}
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(**{
+                name: connection.ops.quote_name(model._meta.db_table)
+                for name, model in tables.items()
+            }, **names), params)
+            return cursor.rowcount
+
+    def send_created(self, instance):
+        post_save.send(
+            sender=self.model, instance=instance, created=True, raw=False,
+            using=self.db, update_fields=None,
+        )
+
+    def send_deleted(self, instance):
+        post_delete.send(sender=self.model, instance=instance, using=self.db)
@@ -0,0 +1,131 @@
+"""
+PostgreSQL с пулом соединений внутри процесса.
+Соединения не закрываются после запроса, а возвращаются в пул,
+общий для всех потоков процесса, поэтому процесс держит
+не больше POOL['MAX_SIZE'] соединений к базе данных.
+"""
+
+import threading
+import time
+
+import psycopg2
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2 на его публичном API.
+    Возвращенные соединения остаются открытыми, всего открыто
+    не больше max_size, getconn ждет освобождения соединения
+    не дольше timeout секунд вместо немедленной ошибки.
+    Соединение, пролежавшее в пуле не меньше check_idle секунд,
+    перед выдачей проверяется запросом SELECT 1; None - не проверять.
+    """
+
+    def __init__(self, min_size, max_size, timeout, check_idle=None,
+                 **conn_params):
+        self._conn_params = conn_params
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._idle = [
+            (psycopg2.connect(**conn_params), time.monotonic())
+            for _ in range(min_size)
+        ]
+
+    def is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if (connection.info.transaction_status
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _take(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # Последнее возвращенное соединение реже простаивает.
+                connection, returned = self._idle.pop()
+            if (connection.closed or self.check_idle is not None
+                    and time.monotonic() - returned >= self.check_idle
+                    and not self.is_usable(connection)):
+                connection.close()
+                continue
+            return connection
+        return psycopg2.connect(**self._conn_params)
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(
+                'Нет свободных соединений в пуле за %s с' % self.timeout)
+        try:
+            return self._take()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            if close or connection.closed:
+                connection.close()
+                return
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                # Соединение с сервером потеряно.
+                connection.close()
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        except psycopg2.Error:
+            connection.close()
+        finally:
+            self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pool(self, conn_params=None):
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = self.settings_dict.get('POOL', {})
+                _pools[self.alias] = ConnectionPool(
+                    options.get('MIN_SIZE', 1),
+                    options.get('MAX_SIZE', 10),
+                    options.get('TIMEOUT', 30),
+                    options.get('CHECK_IDLE'),
+                    **(conn_params or self.get_connection_params())
+                )
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).getconn()
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Незавершенная транзакция откатывается пулом,
+                # сломанное соединение пул закрывает.
+                self.get_pool().putconn(
+                    self.connection, close=self.errors_occurred)
@@ -77,10 +77,75 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        # Время жизни постоянного соединения в секундах, 0 - закрывать
+        # после каждого запроса.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
+# Проверять перед использованием постоянные соединения, простоявшие
+# без запросов не меньше DB_CONN_HEALTH_CHECK_IDLE секунд.
+DB_CONN_HEALTH_CHECKS = os.getenv(
+    'DB_CONN_HEALTH_CHECKS', default='true').lower() in ('1', 'true', 'yes')
+DB_CONN_HEALTH_CHECK_IDLE = float(
+    os.getenv('DB_CONN_HEALTH_CHECK_IDLE', default=30)
+)
+
+# Пул соединений внутри процесса: потоки процесса используют не больше
+# DB_POOL_MAX_SIZE соединений и возвращают их в пул после запроса.
+if os.getenv('DB_POOL', default='false').lower() in ('1', 'true', 'yes'):
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram_project.db.pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', default=1)),
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=30)),
+            'CHECK_IDLE': (
+                DB_CONN_HEALTH_CHECK_IDLE if DB_CONN_HEALTH_CHECKS else None),
+        },
+    })
+
+
+# Cache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+# Данные в памяти процесса (теги) сверяются с версией в кеше
+# не чаще раза в столько секунд.
+VERSION_CHECK_INTERVAL = float(
+    os.getenv('VERSION_CHECK_INTERVAL', default=5)
+)
+
+SHOPPING_LIST_CACHE_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', default=60 * 60 * 24)
+)
+
+# max-age в Cache-Control: теги и продукты, страница рецепта.
+REFERENCE_CACHE_MAX_AGE = int(
+    os.getenv('REFERENCE_CACHE_MAX_AGE', default=60 * 10)
+)
+RECIPE_CACHE_MAX_AGE = int(os.getenv('RECIPE_CACHE_MAX_AGE', default=60))
+
+# count в постраничных ответах: время жизни в кэше и порог,
+# начиная с которого для списков без фильтров берется оценка
+# из статистики PostgreSQL.
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=30)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', default=10000)
+)
+
 
 # Password validation
 
@@ -122,6 +187,37 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'bstatic')
 MEDIA_URL = '/bmedia/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'bmedia')
 
+# Наибольший размер картинки рецепта после декодирования base64, байт.
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+# Наибольшее число пикселей картинки после распаковки.
+IMAGE_MAX_PIXELS = int(
+    os.getenv('IMAGE_MAX_PIXELS', default=40 * 1000 * 1000)
+)
+
+# Обработка картинок рецептов: наибольший размер оригинала,
+# формат и качество сжатия, размеры уменьшенных копий.
+RECIPE_IMAGE_MAX_SIZE = (1600, 1600)
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', default='WEBP')
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', default=80))
+RECIPE_IMAGE_RENDITIONS = {
+    'small': (300, 300),
+    'medium': (600, 600),
+}
+
+# Сортировка ordering=popular: учитываются добавления в избранное
+# за последние WINDOW_DAYS дней, вес добавления уменьшается вдвое
+# каждые HALF_LIFE_HOURS часов.
+POPULAR_RECIPES_WINDOW_DAYS = int(
+    os.getenv('POPULAR_RECIPES_WINDOW_DAYS', default=30))
+POPULAR_RECIPES_HALF_LIFE_HOURS = int(
+    os.getenv('POPULAR_RECIPES_HALF_LIFE_HOURS', default=72))
+
+# Лента подписок: рецепты авторов, у которых не больше
+# FEED_FANOUT_MAX_FOLLOWERS подписчиков, рассылаются в ленты при
+# публикации, рецепты остальных авторов читаются при запросе ленты.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=1000))
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -129,6 +225,13 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Поиск продуктов: prefix (по умолчанию) - только по началу названия,
+# ranked - сначала по началу, затем по вхождению, не более LIMIT записей.
+INGREDIENT_SEARCH_MODE = os.getenv('INGREDIENT_SEARCH_MODE', default='prefix')
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=50)
+)
+
 DOMAIN_NAME = 'stekaleksandr.sytes.net'
 SENDER_MAIL = 'noreply@' + DOMAIN_NAME
 
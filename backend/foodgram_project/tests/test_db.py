@@ -0,0 +1,109 @@
+import time
+from unittest import mock
+
+import psycopg2
+from django.test import SimpleTestCase, override_settings
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from ..db import close_unusable_connections
+from ..db.pool.base import ConnectionPool
+
+
+def fake_connection(*args, **kwargs):
+    connection = mock.MagicMock(closed=False)
+    connection.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return connection
+
+
+@mock.patch('psycopg2.connect', side_effect=fake_connection)
+class ConnectionPoolTest(SimpleTestCase):
+    def test_returned_connections_are_reused(self, connect):
+        """Возвращенные соединения остаются открытыми до MAX_SIZE."""
+        pool = ConnectionPool(1, 3, 1)
+        taken = [pool.getconn() for _ in range(3)]
+        for connection in taken:
+            pool.putconn(connection)
+        again = [pool.getconn() for _ in range(3)]
+        self.assertCountEqual(again, taken)
+        self.assertEqual(connect.call_count, 3)
+        for connection in taken:
+            connection.close.assert_not_called()
+
+    def test_broken_connections_are_closed(self, connect):
+        """
+        Соединение с ошибкой и потерянное соединение закрываются,
+        незавершенная транзакция откатывается.
+        """
+        pool = ConnectionPool(0, 3, 1)
+        failed, lost, in_transaction = [pool.getconn() for _ in range(3)]
+        lost.info.transaction_status = extensions.TRANSACTION_STATUS_UNKNOWN
+        in_transaction.info.transaction_status = (
+            extensions.TRANSACTION_STATUS_INTRANS)
+        pool.putconn(failed, close=True)
+        pool.putconn(lost)
+        pool.putconn(in_transaction)
+        failed.close.assert_called_once_with()
+        lost.close.assert_called_once_with()
+        in_transaction.rollback.assert_called_once_with()
+        self.assertIs(pool.getconn(), in_transaction)
+
+    def test_idle_connections_checked(self, connect):
+        """
+        Соединение, пролежавшее в пуле check_idle секунд, проверяется
+        перед выдачей; неработающее заменяется новым.
+        """
+        pool = ConnectionPool(0, 2, 1, check_idle=60)
+        connection = pool.getconn()
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(), connection)
+        connection.cursor.assert_not_called()
+        pool.putconn(connection)
+        pool.check_idle = 0
+        self.assertIs(pool.getconn(), connection)
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with('SELECT 1')
+        pool.putconn(connection)
+        connection.cursor.side_effect = psycopg2.OperationalError
+        fresh = pool.getconn()
+        self.assertIsNot(fresh, connection)
+        connection.close.assert_called_once_with()
+        self.assertEqual(connect.call_count, 2)
+
+    def test_timeout(self, connect):
+        """Без свободных соединений getconn ждет не дольше timeout."""
+        pool = ConnectionPool(0, 1, 0.01)
+        pool.getconn()
+        with self.assertRaises(PoolError):
+            pool.getconn()
+
+
+@override_settings(DB_CONN_HEALTH_CHECK_IDLE=30)
+class CloseUnusableConnectionsTest(SimpleTestCase):
+    def test_only_unusable_connections_are_closed(self):
+        """
+        Закрываются только неработающие соединения вне транзакции,
+        простоявшие без запросов DB_CONN_HEALTH_CHECK_IDLE секунд.
+        """
+        idle_since = time.monotonic() - 60
+        usable, unusable, in_atomic, unopened, recent = (
+            mock.Mock(connection=object(), in_atomic_block=False),
+            mock.Mock(connection=object(), in_atomic_block=False),
+            mock.Mock(connection=object(), in_atomic_block=True),
+            mock.Mock(connection=None, in_atomic_block=False),
+            mock.Mock(connection=object(), in_atomic_block=False),
+        )
+        usable.is_usable.return_value = True
+        for connection in (unusable, in_atomic, unopened, recent):
+            connection.is_usable.return_value = False
+        for connection in (usable, unusable, in_atomic, unopened):
+            connection.idle_since = idle_since
+        recent.idle_since = time.monotonic()
+        with mock.patch('foodgram_project.db.connections') as connections:
+            connections.all.return_value = [
+                usable, unusable, in_atomic, unopened, recent]
+            close_unusable_connections()
+        unusable.close.assert_called_once_with()
+        for connection in (usable, in_atomic, unopened, recent):
+            connection.close.assert_not_called()
+        recent.is_usable.assert_not_called()
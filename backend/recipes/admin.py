@@ -9,15 +9,12 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'author', 'favorites')
+    list_display = ('pk', 'name', 'author', 'favorites_count')
     search_fields = ('text',)
     list_filter = ('author', 'name', 'tags',)
     empty_value_display = '-пусто-'
     inlines = (RecipeIngredientInline, )
 
-    def favorites(self, obj):
-        return obj.favorites.count()
-
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'color', 'slug')
@@ -27,6 +24,7 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     list_filter = ('name',)
+    search_fields = ('name',)
 
 
 admin.site.register(Recipe, RecipeAdmin)
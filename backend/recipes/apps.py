@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,31 @@
+"""
+Проверка кеша, в котором хранятся версии данных recipes.versions.
+"""
+
+from django.conf import settings
+from django.core import checks
+
+# Кеши, данные которых не видны другим процессам.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register('caches')
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии данных должны быть общими для всех процессов gunicorn:
+    иначе изменение тегов, продуктов или корзины в одном процессе
+    не сбрасывает данные в памяти и ETag в остальных.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [checks.Warning(
+        'Кеш {} не общий для процессов, изменения в одном процессе '
+        'не видны в остальных.'.format(backend),
+        hint='Укажите общий кеш в CACHE_BACKEND и CACHE_LOCATION, '
+             'например memcached из infra/docker-compose.yml.',
+        id='recipes.W001',
+    )]
@@ -0,0 +1,61 @@
+"""
+Счетчики связанных записей, хранящиеся в самих моделях:
+избранное и корзины рецепта, рецепты и подписчики пользователя.
+Счетчики меняются выражениями F() в транзакции записи, которая
+их изменила. bulk_create и update() сигналов не отправляют,
+расхождения после них исправляет команда recount.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Follow, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Модель со счетчиком, поле счетчика, считаемая модель и ее внешний ключ.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Прибавляет delta к счетчику одним UPDATE без чтения строки."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        # Счетчик с расхождением не уходит ниже нуля.
+        queryset = queryset.filter(**{field + '__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос с настоящим числом связанных записей."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def recount(model, field, related_model, related_field):
+    """
+    Исправляет счетчик у всех строк с расхождением одним UPDATE.
+    Возвращает число исправленных строк.
+    """
+    drifted = model.objects.annotate(
+        actual=actual_count(related_model, related_field)
+    ).exclude(**{field: F('actual')}).values('pk')
+    return model.objects.filter(pk__in=drifted).update(
+        **{field: actual_count(related_model, related_field)})
+
+
+def change_counters(sender, instance, delta):
+    """Меняет счетчики, которые считают записи модели sender."""
+    for model, field, related_model, related_field in COUNTERS:
+        if related_model is sender:
+            attname = sender._meta.get_field(related_field).attname
+            change_counter(model, getattr(instance, attname), field, delta)
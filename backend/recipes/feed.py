@@ -0,0 +1,69 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+Рецепты авторов, у которых не больше FEED_FANOUT_MAX_FOLLOWERS
+подписчиков, лежат в ящике FeedEntry подписчика; рецепты остальных
+авторов читаются из Recipe по индексу (author, pub_date, id).
+На страницу из каждого источника берется не больше limit кандидатов
+после курсора, поэтому стоимость страницы не зависит от глубины ленты.
+"""
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from users.models import Follow
+
+from .models import FeedEntry, Recipe
+
+RECIPE_TABLE = connection.ops.quote_name(Recipe._meta.db_table)
+
+
+def get_merged_authors(user):
+    """Авторы из подписок пользователя, чьи рецепты не рассылаются."""
+    return Follow.objects.filter(
+        user=user,
+        author__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).order_by().values('author_id')
+
+
+def get_merged_recipes_sql(authors, apply_cursor, limit):
+    """
+    id до limit рецептов после курсора у каждого автора, по отдельному
+    индексному сканированию на автора через LATERAL (PostgreSQL).
+    """
+    recent = apply_cursor(
+        Recipe.objects.extra(where=[
+            '{}.author_id = feed_authors.author_id'.format(RECIPE_TABLE)
+        ]),
+        fields=('pub_date', 'id'),
+    ).values('id')[:limit]
+    authors_sql, authors_params = authors.query.sql_with_params()
+    recent_sql, recent_params = recent.query.sql_with_params()
+    return (
+        'SELECT recent.id FROM ({}) AS feed_authors '
+        'CROSS JOIN LATERAL ({}) AS recent'.format(authors_sql, recent_sql),
+        [*authors_params, *recent_params],
+    )
+
+
+def filter_feed(queryset, user, apply_cursor, limit):
+    """
+    Рецепты queryset из ленты user. apply_cursor(queryset, fields)
+    отбирает строки после курсора страницы в ее порядке по полям
+    даты и id, limit - наибольшее число строк на странице.
+    """
+    inbox = apply_cursor(
+        FeedEntry.objects.filter(user=user),
+        fields=('pub_date', 'recipe_id'),
+    ).values('recipe_id')[:limit]
+    authors = get_merged_authors(user)
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.filter(Q(id__in=inbox) | Q(author__in=authors))
+    inbox_sql, inbox_params = inbox.query.sql_with_params()
+    merged_sql, merged_params = get_merged_recipes_sql(
+        authors, apply_cursor, limit)
+    # Django 2.2 не строит LATERAL, условие собирается вручную.
+    return queryset.extra(
+        where=['{table}.id IN ({inbox}) OR {table}.id IN ({merged})'.format(
+            table=RECIPE_TABLE, inbox=inbox_sql, merged=merged_sql)],
+        params=[*inbox_params, *merged_params],
+    )
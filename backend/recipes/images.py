@@ -0,0 +1,94 @@
+"""
+Обработка картинок рецептов.
+Оригинал уменьшается до RECIPE_IMAGE_MAX_SIZE и перекодируется
+в RECIPE_IMAGE_FORMAT, рядом с ним в папке renditions сохраняются
+копии фиксированных размеров из RECIPE_IMAGE_RENDITIONS.
+"""
+
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+RENDITIONS_DIR = 'renditions'
+
+
+def get_extension():
+    return EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]
+
+
+def open_image(file):
+    image = ImageOps.exif_transpose(Image.open(file))
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    if settings.RECIPE_IMAGE_FORMAT == 'JPEG' or not has_alpha:
+        return image.convert('RGB')
+    return image.convert('RGBA')
+
+
+def encode(image):
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        settings.RECIPE_IMAGE_FORMAT,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+    )
+    return buffer.getvalue()
+
+
+def is_processed(file):
+    """Оригинал уже в нужном формате и не больше наибольшего размера."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        processed = (
+            image.format == settings.RECIPE_IMAGE_FORMAT
+            and width <= settings.RECIPE_IMAGE_MAX_SIZE[0]
+            and height <= settings.RECIPE_IMAGE_MAX_SIZE[1]
+        )
+    file.seek(0)
+    return processed
+
+
+def process_original(file):
+    """Уменьшенный и перекодированный оригинал для сохранения в поле."""
+    file.seek(0)
+    image = open_image(file)
+    image.thumbnail(settings.RECIPE_IMAGE_MAX_SIZE, Image.LANCZOS)
+    return ContentFile(encode(image), name='image.' + get_extension())
+
+
+def rendition_name(name, rendition):
+    directory, filename = os.path.split(name)
+    root = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, RENDITIONS_DIR,
+        '{}_{}.{}'.format(root, rendition, get_extension())
+    )
+
+
+def make_renditions(image):
+    """Сохраняет копии всех размеров для картинки из поля рецепта."""
+    image.open('rb')
+    try:
+        source = open_image(image)
+        source.load()
+    finally:
+        image.close()
+    for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        name = rendition_name(image.name, rendition)
+        if image.storage.exists(name):
+            image.storage.delete(name)
+        image.storage.save(name, ContentFile(encode(
+            ImageOps.fit(source, size, Image.LANCZOS))))
+
+
+def rendition_urls(image):
+    if not image:
+        return {}
+    return {
+        rendition: image.storage.url(rendition_name(image.name, rendition))
+        for rendition in settings.RECIPE_IMAGE_RENDITIONS
+    }
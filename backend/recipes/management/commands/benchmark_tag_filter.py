@@ -0,0 +1,102 @@
+import random
+from time import perf_counter
+
+from api.filters import RecipeFilter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import Recipe, Tag
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает фильтр рецептов по тегам через соединение '
+        '(tags__slug и distinct) с фильтром RecipeFilter на сгенерированных '
+        'данных. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        author = User.objects.create_user(
+            username='benchmark', email='benchmark@example.com')
+        tags = [
+            Tag.objects.get_or_create(
+                slug='benchmark-%s' % i,
+                defaults={
+                    'name': 'Benchmark %s' % i,
+                    'color': '#B0%04X' % i,
+                }
+            )[0]
+            for i in range(options['tags'])
+        ]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name='Рецепт %s' % i,
+                text='Рецепт %s' % i,
+                cooking_time=10,
+            )
+            for i in range(options['recipes'])
+        )
+        if not recipes[0].pk:
+            recipes = Recipe.objects.filter(author=author)
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for recipe in recipes
+            for tag in random.sample(tags, options['tags_per_recipe'])
+        )
+        self.slugs = [tag.slug for tag in tags[:options['filter_tags']]]
+
+    def measure(self, repeat, func):
+        started = perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (perf_counter() - started) / repeat * 1000, result
+
+    def join_filter(self):
+        # Так работал AllValuesMultipleFilter: выбор значений,
+        # соединение с тегами и distinct() из MultipleChoiceFilter.
+        list(Recipe.objects.distinct().order_by('tags__slug').values_list(
+            'tags__slug', flat=True))
+        queryset = Recipe.objects.filter(
+            tags__slug__in=self.slugs).distinct()
+        return queryset.count(), list(queryset.values_list('id', flat=True))
+
+    def recipe_filter(self):
+        queryset = RecipeFilter(
+            {'tags': self.slugs}, queryset=Recipe.objects.all()).qs
+        return queryset.count(), list(queryset.values_list('id', flat=True))
+
+    def run(self, options):
+        for title, func in (
+            ('tags__slug', self.join_filter),
+            ('RecipeFilter', self.recipe_filter),
+        ):
+            elapsed, (count, ids) = self.measure(options['repeat'], func)
+            self.stdout.write(
+                '{:<14} {:>9.1f} мс  count={} строк={} уникальных={}'.format(
+                    title, elapsed, count, len(ids), len(set(ids)))
+            )
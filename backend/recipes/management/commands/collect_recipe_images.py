@@ -0,0 +1,67 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...images import RENDITIONS_DIR, rendition_name
+from ...models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки рецептов, на которые не ссылается ни один '
+        'рецепт, и их уменьшенные копии. Картинки с одинаковым '
+        'содержимым хранятся одним файлом, он удаляется, когда '
+        'ссылок на него не остается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы моложе этого числа минут, '
+                 'они могут принадлежать незавершенным транзакциям.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только вывести файлы, которые будут удалены.')
+
+    def list_files(self, storage, directory):
+        if not storage.exists(directory):
+            return []
+        return [
+            os.path.join(directory, name)
+            for name in storage.listdir(directory)[1]
+        ]
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage, directory = field.storage, field.upload_to
+        references = Counter(
+            Recipe.objects.exclude(image='').values_list('image', flat=True))
+        renditions = {
+            rendition_name(name, rendition)
+            for name in references
+            for rendition in settings.RECIPE_IMAGE_RENDITIONS
+        }
+        threshold = timezone.now() - timedelta(minutes=options['min_age'])
+        orphans = [
+            name for name in self.list_files(storage, directory)
+            if references[name] == 0
+        ] + [
+            name for name in self.list_files(
+                storage, os.path.join(directory, RENDITIONS_DIR))
+            if name not in renditions
+        ]
+        deleted = 0
+        for name in orphans:
+            if storage.get_modified_time(name) > threshold:
+                continue
+            self.stdout.write(name)
+            if not options['dry_run']:
+                storage.delete(name)
+            deleted += 1
+        self.stdout.write('{}: {}, используется картинок: {}'.format(
+            'Будет удалено' if options['dry_run'] else 'Удалено',
+            deleted, len(references)))
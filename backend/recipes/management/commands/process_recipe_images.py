@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from ...images import is_processed, make_renditions, rendition_name
+from ...models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает уже загруженные картинки рецептов: уменьшает '
+        'и перекодирует оригиналы, создает недостающие уменьшенные копии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уменьшенные копии, даже если они есть.')
+
+    def handle(self, *args, **options):
+        processed = renditions = 0
+        for recipe in Recipe.objects.exclude(image='').iterator():
+            image = recipe.image
+            if not image.storage.exists(image.name):
+                self.stderr.write(
+                    'Рецепт {}: нет файла {}'.format(recipe.id, image.name))
+                continue
+            with image.open('rb'):
+                if not is_processed(image):
+                    # Сигнал pre_save обработает новую картинку
+                    # и создаст ее уменьшенные копии.
+                    recipe.image = ContentFile(image.read(), name=image.name)
+                    recipe.save(update_fields=['image'])
+                    processed += 1
+                    continue
+            if options['force'] or not all(
+                image.storage.exists(rendition_name(image.name, rendition))
+                for rendition in settings.RECIPE_IMAGE_RENDITIONS
+            ):
+                make_renditions(image)
+                renditions += 1
+        self.stdout.write(
+            'Обработано оригиналов: {}, созданы копии для: {}'.format(
+                processed, renditions))
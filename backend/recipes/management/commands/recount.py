@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ...counters import COUNTERS, recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного и корзин рецептов, рецептов '
+        'и подписчиков пользователей. Каждый счетчик исправляется одним '
+        'UPDATE только у строк с расхождением.'
+    )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = recount(model, field, related_model, related_field)
+            self.stdout.write('{}.{}: исправлено {}'.format(
+                model.__name__, field, fixed))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ...ranking import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет популярность рецептов для ordering=popular '
+        'по новым добавлениям в избранное. Запускается периодически, '
+        'например раз в несколько минут, и с --full раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать популярность всех рецептов по окну.')
+
+    def handle(self, *args, **options):
+        updated = refresh(full=options['full'])
+        self.stdout.write('Обновлено рецептов: {}'.format(updated))
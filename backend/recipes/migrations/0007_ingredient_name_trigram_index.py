@@ -0,0 +1,34 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_name_trgm'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Индекс для поиска продуктов в админке (search_fields, icontains).
+    # API ищет по индексу в памяти recipes.search и базу не читает.
+    # Выражение совпадает с тем, что Django строит для
+    # istartswith/icontains: UPPER("name"::text) LIKE UPPER(%s).
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS {} ON recipes_ingredient '
+        'USING gin (UPPER(name::text) gin_trgm_ops)'.format(INDEX_NAME)
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {}'.format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_auto_20221221_2215'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,6 +1,12 @@
 from colorfield.fields import ColorField
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
+from foodgram_project.db.managers import RawSQLManager
+from users.models import Follow
+
+from .storage import recipe_image_storage
 
 User = get_user_model()
 
@@ -65,6 +71,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/images/',
+        storage=recipe_image_storage,
         blank=True
     )
     ingredients = models.ManyToManyField(
@@ -82,9 +89,26 @@ class Recipe(models.Model):
         verbose_name='Время приготовления',
         help_text='Время приготовления'
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         # выводим описание рецепта
@@ -111,6 +135,57 @@ class RecipeIngredientDetails(models.Model):
         return f'{self.recipe}_{self.ingredient}_{self.amount}'
 
 
+class UserRecipeManager(RawSQLManager):
+    """
+    Добавление и удаление рецепта у пользователя одним запросом.
+    """
+    tables = {'recipe': Recipe}
+
+    def add(self, user_id, recipe_id):
+        """
+        INSERT ... ON CONFLICT DO NOTHING. Возвращает False,
+        если рецепт уже добавлен или рецепта не существует.
+        Остальные поля записываются со значениями по умолчанию.
+        """
+        connection = connections[self.db]
+        instance = self.model(user_id=user_id, recipe_id=recipe_id)
+        fields = [
+            field for field in self.model._meta.concrete_fields
+            if not field.primary_key and field.name != 'recipe'
+        ]
+        with transaction.atomic(using=self.db, savepoint=False):
+            added = self.execute(
+                'INSERT INTO {table} ({columns}, recipe_id) '
+                'SELECT {values}, id FROM {recipe} WHERE id = %s '
+                'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+                [
+                    *(field.get_db_prep_save(
+                        getattr(instance, field.attname), connection)
+                      for field in fields),
+                    recipe_id,
+                ],
+                columns=', '.join(
+                    connection.ops.quote_name(field.column)
+                    for field in fields),
+                values=', '.join(['%s'] * len(fields)),
+            ) > 0
+            if added:
+                self.send_created(instance)
+        return added
+
+    def remove(self, user_id, recipe_id):
+        """Один DELETE. Возвращает False, если удалять было нечего."""
+        with transaction.atomic(using=self.db, savepoint=False):
+            removed = self.execute(
+                'DELETE FROM {table} WHERE user_id = %s AND recipe_id = %s',
+                [user_id, recipe_id]
+            ) > 0
+            if removed:
+                self.send_deleted(
+                    self.model(user_id=user_id, recipe_id=recipe_id))
+        return removed
+
+
 class Favorite(models.Model):
     """
     Избранные рецепты
@@ -126,11 +201,25 @@ class Favorite(models.Model):
         related_name="favorites",
         on_delete=models.CASCADE,
     )
+    # NULL - добавлено до появления поля, дата неизвестна
+    # и в популярности не учитывается.
+    created = models.DateTimeField(
+        'Добавлен',
+        default=timezone.now,
+        null=True,
+        db_index=True,
+    )
+
+    objects = UserRecipeManager()
 
     class Meta():
         ordering = ['-id']
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'),
+        ]
 
     def __str__(self):
         return f'избранное пользователя {self.user}'
@@ -153,12 +242,152 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
         )
 
+    objects = UserRecipeManager()
+
     class Meta():
         ordering = ['-id']
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
-        models.UniqueConstraint(
-            fields=['user', 'recipe'], name='unique_recording')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_shopping_cart'),
+        ]
 
     def __str__(self):
         return f'список покупок пользователя {self.user}'
+
+
+class RecipeRanking(models.Model):
+    """
+    Популярность рецепта для сортировки ordering=popular.
+    score - логарифм суммы весов добавлений в избранное за окно
+    POPULAR_RECIPES_WINDOW_DAYS, вес растет вдвое каждые
+    POPULAR_RECIPES_HALF_LIFE_HOURS, что равносильно затуханию старых
+    добавлений. Обновляется командой refresh_popular_recipes.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(
+        'Популярность',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'], name='recipe_ranking_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'популярность рецепта {self.recipe_id}'
+
+
+class RecipeRankingState(models.Model):
+    """
+    Последнее добавление в избранное, учтенное в популярности.
+    Единственная строка с pk=1.
+    """
+    last_favorite_id = models.PositiveIntegerField(default=0)
+    refreshed = models.DateTimeField(null=True)
+
+
+class FeedEntryManager(RawSQLManager):
+    """
+    Рассылка рецептов в ленты подписчиков (fan-out при записи).
+    Рассылаются рецепты авторов, у которых не больше
+    FEED_FANOUT_MAX_FOLLOWERS подписчиков, рецепты остальных авторов
+    лента читает сама. Каждая операция - один запрос.
+    """
+    tables = {'recipe': Recipe, 'follow': Follow, 'user': User}
+
+    def fan_out(self, recipe_id):
+        """Рецепт в ленты всех подписчиков автора."""
+        return self.execute(
+            'INSERT INTO {table} (user_id, recipe_id, pub_date) '
+            'SELECT f.user_id, r.id, r.pub_date FROM {recipe} r '
+            'JOIN {follow} f ON f.author_id = r.author_id '
+            'JOIN {user} u ON u.id = r.author_id '
+            'WHERE r.id = %s AND u.followers_count <= %s '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [recipe_id, settings.FEED_FANOUT_MAX_FOLLOWERS]
+        )
+
+    def add_author(self, user_id, author_id):
+        """Рецепты автора в ленту нового подписчика."""
+        return self.execute(
+            'INSERT INTO {table} (user_id, recipe_id, pub_date) '
+            'SELECT %s, r.id, r.pub_date FROM {recipe} r '
+            'JOIN {user} u ON u.id = r.author_id '
+            'WHERE r.author_id = %s AND u.followers_count <= %s '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [user_id, author_id, settings.FEED_FANOUT_MAX_FOLLOWERS]
+        )
+
+    def remove_author(self, user_id, author_id):
+        """Рецепты автора из ленты отписавшегося пользователя."""
+        return self.execute(
+            'DELETE FROM {table} WHERE user_id = %s AND recipe_id IN '
+            '(SELECT id FROM {recipe} WHERE author_id = %s)',
+            [user_id, author_id]
+        )
+
+    def refill_author(self, author_id):
+        """
+        Рецепты автора в ленты всех подписчиков, если подписчиков
+        стало ровно FEED_FANOUT_MAX_FOLLOWERS: раньше лента читала его
+        рецепты сама, а теперь они рассылаются.
+        """
+        return self.execute(
+            'INSERT INTO {table} (user_id, recipe_id, pub_date) '
+            'SELECT f.user_id, r.id, r.pub_date FROM {recipe} r '
+            'JOIN {follow} f ON f.author_id = r.author_id '
+            'JOIN {user} u ON u.id = r.author_id '
+            'WHERE r.author_id = %s AND u.followers_count = %s '
+            'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [author_id, settings.FEED_FANOUT_MAX_FOLLOWERS]
+        )
+
+
+class FeedEntry(models.Model):
+    """
+    Рецепт в ленте подписчика. pub_date копирует дату рецепта,
+    чтобы страница ленты читалась по индексу пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Рецепты в лентах'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'рецепт {self.recipe_id} в ленте {self.user_id}'
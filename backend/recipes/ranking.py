@@ -0,0 +1,103 @@
+"""
+Популярность рецептов для сортировки ordering=popular.
+Вес добавления в избранное в момент t равен 2 ** ((t - EPOCH) / T),
+где T - период полураспада. Порядок по сумме таких весов совпадает
+с порядком по сумме затухающих весов в любой момент времени, поэтому
+новые добавления просто прибавляются к оценке, а старые оценки
+не пересчитываются. Хранится логарифм суммы, чтобы не переполнить float.
+"""
+
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Favorite, Recipe, RecipeRanking, RecipeRankingState
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+
+
+def log_weight(created):
+    half_life = settings.POPULAR_RECIPES_HALF_LIFE_HOURS * 3600
+    return (created - EPOCH).total_seconds() / half_life * math.log(2)
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) без переполнения."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def collect_scores(favorites):
+    """Оценки рецептов по добавлениям и наибольший id добавления."""
+    scores = {}
+    last_id = 0
+    for favorite_id, recipe_id, created in favorites.values_list(
+            'id', 'recipe_id', 'created').iterator():
+        weight = log_weight(created)
+        if recipe_id in scores:
+            weight = log_add(scores[recipe_id], weight)
+        scores[recipe_id] = weight
+        last_id = max(last_id, favorite_id)
+    return scores, last_id
+
+
+def create_missing_rankings():
+    """Строки популярности рецептов, созданных без сигналов."""
+    RecipeRanking.objects.bulk_create(
+        (
+            RecipeRanking(recipe_id=pk)
+            for pk in Recipe.objects.filter(
+                ranking__isnull=True).values_list('pk', flat=True)
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def refresh(full=False):
+    """
+    Обновляет популярность по добавлениям в избранное после прошлого
+    обновления. full пересчитывает все оценки по окну: так убираются
+    удаленные и вышедшие из окна добавления, а также добавления,
+    зафиксированные позже добавлений с большим id.
+    Возвращает число рецептов с новой оценкой.
+    """
+    since = timezone.now() - timedelta(
+        days=settings.POPULAR_RECIPES_WINDOW_DAYS)
+    # Добавления без даты (created IS NULL) условие отбрасывает.
+    favorites = Favorite.objects.filter(created__gte=since)
+    with transaction.atomic():
+        state = RecipeRankingState.objects.select_for_update(
+        ).get_or_create(pk=1)[0]
+        create_missing_rankings()
+        if full:
+            last_id = Favorite.objects.aggregate(
+                last_id=Max('id'))['last_id'] or 0
+            scores = collect_scores(favorites.filter(id__lte=last_id))[0]
+            RecipeRanking.objects.exclude(score=0).update(score=0)
+            rankings = [
+                RecipeRanking(recipe_id=pk, score=score)
+                for pk, score in scores.items()
+            ]
+        else:
+            scores, last_id = collect_scores(
+                favorites.filter(id__gt=state.last_favorite_id))
+            last_id = max(last_id, state.last_favorite_id)
+            rankings = list(
+                RecipeRanking.objects.in_bulk(list(scores)).values())
+            for ranking in rankings:
+                score = scores[ranking.pk]
+                # Нулевая оценка - у рецепта еще нет добавлений.
+                ranking.score = (
+                    log_add(ranking.score, score) if ranking.score else score)
+        RecipeRanking.objects.bulk_update(
+            rankings, ['score'], batch_size=BATCH_SIZE)
+        state.last_favorite_id = last_id
+        state.refreshed = timezone.now()
+        state.save()
+    return len(rankings)
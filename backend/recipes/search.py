@@ -0,0 +1,66 @@
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Ingredient
+from .versions import INGREDIENTS_KEY, VersionedRegistry
+
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+PREFIX = 'prefix'
+RANKED = 'ranked'
+
+
+class IngredientIndex(VersionedRegistry):
+    """
+    Индекс продуктов в памяти процесса для поиска по названию.
+    Загружается при первом обращении вместе с версией продуктов
+    из кеша Django и перезагружается, когда версия меняется: в этом
+    процессе сигналами Ingredient, в остальных - при следующей сверке.
+    """
+    version_key = INGREDIENTS_KEY
+
+    def _load(self):
+        rows = tuple(Ingredient.objects.values(*INGREDIENT_FIELDS))
+        folded = tuple(row['name'].casefold() for row in rows)
+        keys = sorted((name, position) for position, name in enumerate(folded))
+        names = [name for name, _ in keys]
+        positions = [position for _, position in keys]
+        return rows, folded, names, positions
+
+    def _prefix_positions(self, names, positions, prefix):
+        found = []
+        index = bisect_left(names, prefix)
+        while index < len(names) and names[index].startswith(prefix):
+            found.append(positions[index])
+            index += 1
+        return sorted(found)
+
+    def search(self, query, mode=PREFIX, limit=None):
+        """
+        Продукты, название которых начинается с query без учета регистра,
+        в порядке Ingredient.Meta.ordering. В режиме RANKED за ними
+        следуют продукты, содержащие query в середине названия.
+        Результат ограничивается limit записями.
+        """
+        rows, folded, names, positions = self._get()
+        query = query.casefold()
+        if not query:
+            return list(rows)
+        found = self._prefix_positions(names, positions, query)
+        if mode == RANKED:
+            found.extend(
+                position for position, name in enumerate(folded)
+                if query in name and not name.startswith(query)
+            )
+        return [rows[position] for position in found[:limit]]
+
+    def autocomplete(self, query):
+        """
+        Поиск в режиме и с ограничением из настроек INGREDIENT_SEARCH_*.
+        """
+        mode = settings.INGREDIENT_SEARCH_MODE
+        limit = settings.INGREDIENT_SEARCH_LIMIT if mode == RANKED else None
+        return self.search(query, mode, limit)
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,130 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from users.models import Follow, User
+
+from .counters import change_counters
+from .images import is_processed, make_renditions, process_original
+from .models import (Favorite, FeedEntry, Ingredient, Recipe,
+                     RecipeIngredientDetails, RecipeRanking, ShoppingCart, Tag)
+from .search import ingredient_index
+from .tags import tag_registry
+from .versions import (INGREDIENTS_KEY, RECIPE_KEY, TAGS_KEY, USER_KEY,
+                       VIEWER_KEY, bump_recipe_shopping_lists,
+                       bump_shopping_list, bump_version)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate_on_commit()
+    bump_version(INGREDIENTS_KEY)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    tag_registry.invalidate_on_commit()
+    bump_version(TAGS_KEY)
+
+
+@receiver(pre_save, sender=Recipe)
+def process_recipe_image(sender, instance, raw=False, **kwargs):
+    # Новая картинка еще не сохранена в хранилище.
+    if raw or not instance.image or instance.image._committed:
+        return
+    # Картинки из API обработаны при валидации сериализатора.
+    if not is_processed(instance.image):
+        instance.image = process_original(instance.image)
+    instance._image_changed = True
+
+
+@receiver(post_save, sender=Recipe)
+def make_recipe_image_renditions(sender, instance, **kwargs):
+    if getattr(instance, '_image_changed', False):
+        make_renditions(instance.image)
+        instance._image_changed = False
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_ranking(sender, instance, created=False, **kwargs):
+    # Сортировка по популярности выводит только рецепты со строкой
+    # в RecipeRanking.
+    if created:
+        RecipeRanking.objects.bulk_create(
+            [RecipeRanking(recipe=instance)], ignore_conflicts=True)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    bump_version(RECIPE_KEY.format(instance.pk))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_version(RECIPE_KEY.format(instance.pk))
+    elif pk_set:
+        for recipe_id in pk_set:
+            bump_version(RECIPE_KEY.format(recipe_id))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login.
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version(USER_KEY.format(instance.pk))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_viewer(sender, instance, **kwargs):
+    bump_version(VIEWER_KEY.format(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_list(sender, instance, **kwargs):
+    bump_shopping_list(instance.user_id)
+    bump_version(VIEWER_KEY.format(instance.user_id))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredientDetails)
+def invalidate_recipe_shopping_lists(sender, instance, **kwargs):
+    bump_version(RECIPE_KEY.format(instance.recipe_id))
+    bump_recipe_shopping_lists(instance.recipe_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+def increment_counters(sender, instance, created=False, raw=False,
+                       **kwargs):
+    # Фикстуры загружаются вместе со значениями счетчиков.
+    if created and not raw:
+        change_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+def decrement_counters(sender, instance, **kwargs):
+    change_counters(sender, instance, -1)
+
+
+# Ленты подписчиков меняются после счетчиков: рассылка зависит
+# от нового числа подписчиков автора.
+@receiver(post_save, sender=Follow)
+def add_author_to_feed(sender, instance, created=False, raw=False,
+                       **kwargs):
+    if created and not raw:
+        FeedEntry.objects.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_author_from_feed(sender, instance, **kwargs):
+    FeedEntry.objects.remove_author(instance.user_id, instance.author_id)
+    FeedEntry.objects.refill_author(instance.author_id)
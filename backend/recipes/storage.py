@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .images import RENDITIONS_DIR
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище картинок рецептов с именами по SHA-256 содержимого:
+    одинаковые картинки хранятся одним файлом, повторное сохранение
+    возвращает имя существующего файла.
+    Уменьшенные копии из папки renditions сохраняются под своими
+    именами, они и так однозначно определяются оригиналом.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest.hexdigest() + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if os.path.basename(os.path.dirname(name)) == RENDITIONS_DIR:
+            return super().save(name, content, max_length)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = ContentHashStorage()
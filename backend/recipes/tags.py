@@ -0,0 +1,45 @@
+from .models import Tag
+from .versions import TAGS_KEY, VersionedRegistry
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+
+
+class TagRegistry(VersionedRegistry):
+    """
+    Теги в памяти процесса.
+    Загружаются при первом обращении вместе с версией тегов из кеша
+    Django и перезагружаются, когда версия меняется: в этом процессе
+    сигналами Tag, в остальных - при следующей сверке версии.
+    """
+    version_key = TAGS_KEY
+
+    def _load(self):
+        tags = tuple(Tag.objects.all())
+        rows = tuple(
+            {field: getattr(tag, field) for field in TAG_FIELDS}
+            for tag in tags
+        )
+        by_id = {tag.pk: (tag, row) for tag, row in zip(tags, rows)}
+        slugs = {tag.slug: tag.pk for tag in tags}
+        return rows, by_id, slugs
+
+    def all(self):
+        """Данные всех тегов в порядке Tag.Meta.ordering."""
+        return list(self._get()[0])
+
+    def get(self, pk):
+        """Данные тега или None."""
+        found = self._get()[1].get(pk)
+        return found and found[1]
+
+    def get_instance(self, pk):
+        """Экземпляр Tag или None, изменять его нельзя."""
+        found = self._get()[1].get(pk)
+        return found and found[0]
+
+    def slug_map(self):
+        """Соответствие слагов тегов их id."""
+        return self._get()[2]
+
+
+tag_registry = TagRegistry()
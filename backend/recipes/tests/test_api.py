@@ -0,0 +1,422 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from users.models import Follow
+
+from ..models import (Favorite, Ingredient, Recipe, RecipeIngredientDetails,
+                      ShoppingCart, Tag)
+from ..tags import tag_registry
+from .utils import QueryCountMixin
+
+User = get_user_model()
+RECIPES_NUMBER = 12
+
+
+class RecipeViewerFlagsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+            for i in range(RECIPES_NUMBER)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def test_flags_in_list(self):
+        """Флаги избранного, корзины и подписки корректны в списке."""
+        response = self.authorized_client.get(
+            '/api/recipes/', {'limit': RECIPES_NUMBER})
+        results = {item['id']: item for item in response.data['results']}
+        self.assertTrue(results[self.recipes[0].id]['is_favorited'])
+        self.assertFalse(results[self.recipes[0].id]['is_in_shopping_cart'])
+        self.assertTrue(results[self.recipes[1].id]['is_in_shopping_cart'])
+        self.assertFalse(results[self.recipes[1].id]['is_favorited'])
+        for item in results.values():
+            self.assertTrue(item['author']['is_subscribed'])
+
+    def test_flags_in_detail(self):
+        """Флаги корректны на странице рецепта."""
+        response = self.authorized_client.get(
+            '/api/recipes/%s/' % self.recipes[0].id)
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+
+    def test_flags_for_guest(self):
+        """Для анонимного пользователя все флаги ложны."""
+        response = self.guest_client.get(
+            '/api/recipes/%s/' % self.recipes[0].id)
+        self.assertFalse(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+    def test_subscription_in_recipes_query(self):
+        """
+        Подписка на автора вычисляется в запросе рецептов,
+        подписки пользователя отдельно не загружаются.
+        """
+        other = User.objects.create_user(
+            username='other', email='other@example.com')
+        recipe = Recipe.objects.create(
+            author=other, name='Рецепт', text='Текст', cooking_time=10)
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(
+                '/api/recipes/', {'limit': RECIPES_NUMBER + 1})
+        results = {item['id']: item for item in response.data['results']}
+        self.assertFalse(results.pop(recipe.id)['author']['is_subscribed'])
+        self.assertTrue(all(
+            item['author']['is_subscribed'] for item in results.values()))
+        follow_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'users_follow' in query['sql']]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertIn('recipes_recipe', follow_queries[0])
+
+    def test_flags_do_not_add_queries_per_recipe(self):
+        """Флаги не добавляют запросов на каждый рецепт страницы."""
+        self.authorized_client.get('/api/recipes/', {'limit': 1})
+        counts = []
+        for limit in (1, RECIPES_NUMBER):
+            with CaptureQueriesContext(connection) as context:
+                self.authorized_client.get('/api/recipes/', {'limit': limit})
+            counts.append(
+                sum('recipes_favorite' in query['sql']
+                    or 'recipes_shoppingcart' in query['sql']
+                    or 'users_follow' in query['sql']
+                    for query in context.captured_queries)
+            )
+        self.assertEqual(counts[0], counts[1])
+
+
+class RecipeListQueriesTest(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        tags = [
+            Tag.objects.create(
+                name='Тег %s' % i, color='#00000%s' % i, slug='tag%s' % i)
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name='Продукт %s' % i, measurement_unit='г')
+            for i in range(3)
+        ]
+        for i in range(RECIPES_NUMBER):
+            author = User.objects.create_user(
+                username='author%s' % i, email='author%s@example.com' % i)
+            recipe = Recipe.objects.create(
+                author=author,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+            recipe.tags.set(tags)
+            RecipeIngredientDetails.objects.bulk_create(
+                RecipeIngredientDetails(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1)
+                for ingredient in ingredients
+            )
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def test_list_queries_do_not_depend_on_limit(self):
+        """Количество запросов списка рецептов не зависит от limit."""
+        for client in (self.guest_client, self.authorized_client):
+            with self.subTest(client=client):
+                self.assertQueryCountFlat(
+                    client, '/api/recipes/', 'limit',
+                    (1, RECIPES_NUMBER // 2, RECIPES_NUMBER)
+                )
+
+    def test_filtered_list_queries_do_not_depend_on_limit(self):
+        """Фильтры не добавляют запросов на каждый рецепт."""
+        self.assertQueryCountFlat(
+            self.authorized_client, '/api/recipes/', 'limit',
+            (1, RECIPES_NUMBER), {'is_favorited': 1, 'tags': 'tag0'}
+        )
+
+    def test_list_content(self):
+        """Теги и ингредиенты рецепта попадают в ответ."""
+        response = self.guest_client.get('/api/recipes/', {'limit': 1})
+        recipe = response.data['results'][0]
+        self.assertEqual(len(recipe['tags']), 3)
+        self.assertEqual(
+            [item['amount'] for item in recipe['ingredients']],
+            [RECIPES_NUMBER] * 3
+        )
+        self.assertEqual(recipe['ingredients'][0]['measurement_unit'], 'г')
+
+
+class RecipeKeysetPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        for i in range(RECIPES_NUMBER):
+            Recipe.objects.create(
+                author=cls.author,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+        # Рецепты с одинаковой датой упорядочиваются по id.
+        first = Recipe.objects.order_by('id').first()
+        Recipe.objects.filter(id__lte=first.id + 3).update(
+            pub_date=first.pub_date)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_walk_all_pages(self):
+        """Курсор проходит все рецепты без пропусков и повторов."""
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        ids, pages = [], []
+        url = '/api/recipes/?cursor=&limit=5'
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[1]['results'])
+
+    def test_no_count_query(self):
+        """Режим курсора не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/recipes/', {'cursor': '', 'limit': 5})
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in context.captured_queries))
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор возвращает 404."""
+        response = self.client.get('/api/recipes/', {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_mode_by_default(self):
+        """Без курсора используется постраничный режим с count."""
+        response = self.client.get('/api/recipes/', {'limit': 5})
+        self.assertEqual(response.data['count'], RECIPES_NUMBER)
+
+
+class RecipeCountCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+            for i in range(RECIPES_NUMBER)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', params)
+        return response, sum(
+            'COUNT(' in query['sql'] for query in context.captured_queries)
+
+    def test_count_is_cached_by_filter_params(self):
+        """COUNT(*) выполняется один раз для одинаковых фильтров."""
+        response, counts = self.count_queries(
+            {'author': self.author.id, 'limit': 5})
+        self.assertEqual(response.data['count'], RECIPES_NUMBER)
+        self.assertEqual(counts, 1)
+        response, counts = self.count_queries(
+            {'limit': 5, 'page': 2, 'author': self.author.id})
+        self.assertEqual(response.data['count'], RECIPES_NUMBER)
+        self.assertEqual(counts, 0)
+
+    def test_last_page_count_is_exact(self):
+        """Последняя страница не выполняет COUNT(*)."""
+        response, counts = self.count_queries({'limit': 5, 'page': 3})
+        self.assertEqual(response.data['count'], RECIPES_NUMBER)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(counts, 0)
+
+    def test_user_filters_are_cached_per_user(self):
+        """Фильтры по избранному кешируются отдельно для пользователя."""
+        self.client.force_authenticate(self.user)
+        response, _ = self.count_queries({'is_favorited': 1, 'limit': 1})
+        self.assertEqual(response.data['count'], 1)
+        other = User.objects.create_user(
+            username='other', email='other@example.com')
+        self.client.force_authenticate(other)
+        response, _ = self.count_queries({'is_favorited': 1, 'limit': 1})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_pages_without_count(self):
+        """Ссылки на страницы не зависят от закешированного count."""
+        cache.clear()
+        response = self.client.get('/api/recipes/', {'limit': 5})
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get('/api/recipes/', {'limit': 5, 'page': 4})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeTagFilterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tags = [
+            Tag.objects.create(
+                name='Тег %s' % i, color='#00000%s' % i, slug='tag%s' % i)
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                author=author,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+            recipe.tags.set(cls.tags[:i + 1])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        tag_registry.invalidate()
+        self.client = APIClient()
+
+    def get_ids(self, tags):
+        response = self.client.get('/api/recipes/', {'tags': tags})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_several_tags_without_duplicates(self):
+        """Рецепт с несколькими тегами из фильтра выводится один раз."""
+        with CaptureQueriesContext(connection) as context:
+            ids = self.get_ids(['tag0', 'tag1', 'tag2'])
+        self.assertEqual(
+            sorted(ids), sorted(recipe.id for recipe in self.recipes))
+        self.assertFalse(any(
+            'DISTINCT' in query['sql'] for query in context.captured_queries))
+
+    def test_filter_by_tag(self):
+        """Выводятся только рецепты с одним из тегов."""
+        self.assertEqual(
+            sorted(self.get_ids(['tag2', 'tag1'])),
+            sorted(recipe.id for recipe in self.recipes[1:])
+        )
+
+    def test_unknown_tag(self):
+        """Несуществующий тег - ошибка валидации."""
+        response = self.client.get('/api/recipes/', {'tags': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_changed_slug(self):
+        """Измененный слаг сразу доступен в фильтре."""
+        self.tags[2].slug = 'renamed'
+        self.tags[2].save()
+        self.assertEqual(self.get_ids(['renamed']), [self.recipes[2].id])
+
+
+class FavoriteShoppingCartTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст', cooking_time=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove(self):
+        """Статус ответа зависит от того, изменилась ли связь."""
+        for name, model in (
+            ('favorite', Favorite), ('shopping_cart', ShoppingCart)
+        ):
+            with self.subTest(name=name):
+                url = '/api/recipes/%s/%s/' % (self.recipe.id, name)
+                with self.assertNumQueries(3):
+                    response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['id'], self.recipe.id)
+                self.assertEqual(response.data['name'], 'Рецепт')
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(model.objects.count(), 1)
+                with self.assertNumQueries(2):
+                    response = self.client.delete(url)
+                self.assertEqual(response.status_code, 204)
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(model.objects.exists())
+
+    def test_missing_recipe(self):
+        """Несуществующий рецепт - 404."""
+        for name in ('favorite', 'shopping_cart'):
+            for method in ('post', 'delete'):
+                with self.subTest(name=name, method=method):
+                    response = getattr(self.client, method)(
+                        '/api/recipes/%s/%s/' % (self.recipe.id + 1, name))
+                    self.assertEqual(response.status_code, 404)
+
+    def test_flags_follow_changes(self):
+        """Добавление и удаление сбрасывают кеш флагов рецепта."""
+        url = '/api/recipes/%s/' % self.recipe.id
+        self.assertFalse(self.client.get(url).data['is_favorited'])
+        self.client.post(url + 'favorite/')
+        self.assertTrue(self.client.get(url).data['is_favorited'])
+        self.client.delete(url + 'favorite/')
+        self.assertFalse(self.client.get(url).data['is_favorited'])
+
+    def test_unique_constraints(self):
+        """Повторная связь запрещена на уровне базы данных."""
+        for model in (Favorite, ShoppingCart):
+            model.objects.create(user=self.user, recipe=self.recipe)
+            with self.subTest(model=model):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        model.objects.create(
+                            user=self.user, recipe=self.recipe)
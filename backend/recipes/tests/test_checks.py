@@ -0,0 +1,29 @@
+from django.core import checks
+from django.test import SimpleTestCase, override_settings
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+MEMCACHED = {'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    'LOCATION': 'cache:11211',
+}}
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    def get_ids(self):
+        return [
+            message.id for message in checks.run_checks(tags=['caches'])]
+
+    @override_settings(DEBUG=False, CACHES=LOCMEM)
+    def test_process_local_cache(self):
+        """Без DEBUG кеш внутри процесса дает предупреждение."""
+        self.assertEqual(self.get_ids(), ['recipes.W001'])
+
+    def test_shared_cache_or_debug(self):
+        """Общий кеш и режим DEBUG проверку проходят."""
+        for options in (
+            {'DEBUG': False, 'CACHES': MEMCACHED},
+            {'DEBUG': True, 'CACHES': LOCMEM},
+        ):
+            with self.subTest(**options), override_settings(**options):
+                self.assertEqual(self.get_ids(), [])
@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+from users.models import Follow
+
+from ..models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10)
+
+    def assertCounters(self, instance, **counters):
+        instance.refresh_from_db(fields=list(counters))
+        for field, value in counters.items():
+            self.assertEqual(getattr(instance, field), value, field)
+
+    def test_recipe_counters(self):
+        """Избранное и корзина меняют счетчики рецепта."""
+        recipe = self.create_recipe()
+        for name in ('favorite', 'shopping_cart'):
+            self.client.post('/api/recipes/%s/%s/' % (recipe.id, name))
+        self.assertCounters(recipe, favorites_count=1, shopping_carts_count=1)
+        self.client.delete('/api/recipes/%s/favorite/' % recipe.id)
+        self.assertCounters(recipe, favorites_count=0, shopping_carts_count=1)
+
+    def test_user_counters(self):
+        """Рецепты и подписки меняют счетчики автора."""
+        recipe = self.create_recipe()
+        self.create_recipe()
+        self.client.post('/api/users/%s/subscribe/' % self.author.id)
+        self.assertCounters(self.author, recipes_count=2, followers_count=1)
+        recipe.delete()
+        self.client.delete('/api/users/%s/subscribe/' % self.author.id)
+        self.assertCounters(self.author, recipes_count=1, followers_count=0)
+
+    def test_cascade_delete(self):
+        """Удаление пользователя уменьшает счетчики его связей."""
+        user = User.objects.create_user(
+            username='deleted', email='deleted@example.com')
+        recipe = self.create_recipe()
+        Favorite.objects.create(user=user, recipe=recipe)
+        Follow.objects.create(user=user, author=self.author)
+        user.delete()
+        self.assertCounters(recipe, favorites_count=0)
+        self.assertCounters(self.author, followers_count=0)
+
+    def test_recount(self):
+        """recount исправляет только счетчики с расхождением."""
+        recipes = [self.create_recipe() for _ in range(3)]
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.user, recipe=recipe)
+            for recipe in recipes[:2]
+        )
+        Recipe.objects.filter(id=recipes[2].id).update(favorites_count=5)
+        User.objects.filter(id=self.author.id).update(recipes_count=0)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('Recipe.favorites_count: исправлено 1', out.getvalue())
+        self.assertIn(
+            'Recipe.shopping_carts_count: исправлено 2', out.getvalue())
+        self.assertIn('User.recipes_count: исправлено 1', out.getvalue())
+        for recipe, count in zip(recipes, (1, 1, 0)):
+            self.assertCounters(
+                recipe, favorites_count=0, shopping_carts_count=count)
+        self.assertCounters(self.author, recipes_count=3)
@@ -0,0 +1,229 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import Follow
+
+from ..models import FeedEntry, Ingredient, Recipe, Tag
+from ..tags import tag_registry
+from .utils import IMAGE, QueryCountMixin
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTest(QueryCountMixin, TestCase):
+    """
+    small - автор с рассылкой рецептов в ленты, big - автор с двумя
+    подписчиками, его рецепты лента читает сама.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.other, cls.small, cls.big, cls.stranger = [
+            User.objects.create_user(
+                username=name, email='%s@example.com' % name)
+            for name in ('user', 'other', 'small', 'big', 'stranger')
+        ]
+        for user, author in (
+            (cls.user, cls.small), (cls.user, cls.big), (cls.other, cls.big)
+        ):
+            Follow.objects.create(user=user, author=author)
+        for i in range(9):
+            author = (cls.small, cls.big, cls.stranger)[i % 3]
+            recipe = Recipe.objects.create(
+                author=author, name='Рецепт %s' % i, text='Текст',
+                cooking_time=10)
+            FeedEntry.objects.fan_out(recipe.id)
+
+    def setUp(self):
+        cache.clear()
+        tag_registry.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected(self, *authors):
+        return list(Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            pages.append(response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_feed_pages(self):
+        """Лента объединяет рассылку и рецепты авторов без рассылки."""
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 3)
+        ids, pages = self.walk('/api/recipes/feed/?limit=4')
+        self.assertEqual(ids, self.expected(self.small, self.big))
+        self.assertEqual(len(pages), 2)
+        self.assertNotIn('count', pages[0])
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']], ids[:4])
+        self.assertTrue(
+            all(recipe['author']['is_subscribed']
+                for recipe in response.data['results']))
+
+    def test_queries_do_not_depend_on_limit(self):
+        """Количество запросов не зависит от размера страницы."""
+        self.assertQueryCountFlat(
+            self.client, '/api/recipes/feed/', 'limit', (1, 3, 6))
+
+    def test_fan_out_on_create(self):
+        """Новый рецепт автора с рассылкой попадает в ленты подписчиков."""
+        tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='Продукт', measurement_unit='г')
+        for author, entries in ((self.small, 1), (self.big, 0)):
+            with self.subTest(author=author.username):
+                client = APIClient()
+                client.force_authenticate(author)
+                response = client.post('/api/recipes/', {
+                    'tags': [tag.id],
+                    'ingredients': [{'id': ingredient.id, 'amount': 10}],
+                    'name': 'Новый рецепт',
+                    'image': IMAGE,
+                    'text': 'Текст',
+                    'cooking_time': 10,
+                }, format='json')
+                self.assertEqual(response.status_code, 201, response.data)
+                self.assertEqual(FeedEntry.objects.filter(
+                    recipe_id=response.data['id']).count(), entries)
+                ids, _ = self.walk('/api/recipes/feed/')
+                self.assertEqual(ids[0], response.data['id'])
+
+    def test_unfollow(self):
+        """
+        Отписка убирает рецепты автора из ленты. Когда у автора
+        остается FEED_FANOUT_MAX_FOLLOWERS подписчиков, его рецепты
+        рассылаются оставшимся.
+        """
+        self.client.delete('/api/users/%s/subscribe/' % self.small.id)
+        self.assertEqual(
+            self.walk('/api/recipes/feed/')[0], self.expected(self.big))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        other = APIClient()
+        other.force_authenticate(self.other)
+        other.delete('/api/users/%s/subscribe/' % self.big.id)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(
+            self.walk('/api/recipes/feed/')[0], self.expected(self.big))
+
+    def test_follow(self):
+        """Подписка добавляет в ленту уже опубликованные рецепты."""
+        self.client.post('/api/users/%s/subscribe/' % self.stranger.id)
+        self.assertEqual(
+            self.walk('/api/recipes/feed/')[0],
+            self.expected(self.small, self.big, self.stranger)
+        )
+
+    def test_anonymous(self):
+        """Лента доступна только авторизованным пользователям."""
+        response = APIClient().get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 401)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Авторы без рассылки читаются через LATERAL только в PostgreSQL')
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedLateralTest(TestCase):
+    """
+    Лента из ящика автора small и двух авторов без рассылки.
+    У половины рецептов одинаковая дата публикации, их порядок
+    и курсор определяются id.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user, cls.other, cls.small, cls.first, cls.second = [
+            User.objects.create_user(
+                username=name, email='%s@example.com' % name)
+            for name in ('user', 'other', 'small', 'first', 'second')
+        ]
+        cls.authors = (cls.small, cls.first, cls.second)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        for author in (cls.first, cls.second):
+            Follow.objects.create(user=cls.other, author=author)
+        same_date = timezone.now() - timedelta(days=1)
+        for i in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.authors[i % 3], name='Рецепт %s' % i,
+                text='Текст', cooking_time=10)
+            if i % 2:
+                Recipe.objects.filter(id=recipe.id).update(
+                    pub_date=same_date)
+            FeedEntry.objects.fan_out(recipe.id)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def walk(self, limit):
+        pages, url = [], '/api/recipes/feed/?limit=%s' % limit
+        while url:
+            pages.append(self.get_page(url))
+            url = pages[-1]['next']
+        return pages
+
+    def ids(self, page):
+        return [recipe['id'] for recipe in page['results']]
+
+    def test_order_and_cursor(self):
+        """
+        Страницы идут в порядке (-pub_date, -id) без пропусков
+        и повторов, авторы без рассылки читаются через LATERAL.
+        """
+        expected = list(Recipe.objects.filter(
+            author__in=self.authors).order_by(
+                '-pub_date', '-id').values_list('id', flat=True))
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 4)
+        for limit in (1, 2, 5, 12):
+            with self.subTest(limit=limit):
+                with CaptureQueriesContext(connection) as context:
+                    pages = self.walk(limit)
+                self.assertEqual(
+                    [id for page in pages for id in self.ids(page)],
+                    expected)
+                self.assertTrue(any(
+                    'LATERAL' in query['sql']
+                    for query in context.captured_queries))
+
+    def test_previous_page(self):
+        """Ссылка previous возвращает на предыдущую страницу."""
+        pages = self.walk(4)
+        self.assertEqual(len(pages), 3)
+        for number in (1, 2):
+            self.assertEqual(
+                self.ids(self.get_page(pages[number]['previous'])),
+                self.ids(pages[number - 1]))
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import Favorite, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='viewer', email='viewer@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Каша', text='Текст', cooking_time=10)
+        cls.recipe.tags.add(cls.tag)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def assertNotModified(self, client, url):
+        etag = client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_reference_data_not_modified(self):
+        """Неизмененные теги и продукты отдаются ответом 304."""
+        for url in ('/api/tags/', '/api/ingredients/',
+                    '/api/ingredients/?name=с'):
+            with self.subTest(url=url):
+                self.assertNotModified(self.guest_client, url)
+
+    def test_etag_changes_with_data(self):
+        """Изменение тегов меняет ETag."""
+        etag = self.assertNotModified(self.guest_client, '/api/tags/')
+        self.tag.name = 'Ранний завтрак'
+        self.tag.save()
+        response = self.guest_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'Ранний завтрак')
+
+    def test_cache_control(self):
+        """Анонимные ответы публичные, персональные - приватные."""
+        url = '/api/recipes/%s/' % self.recipe.id
+        self.assertIn('public', self.guest_client.get(url)['Cache-Control'])
+        self.assertIn(
+            'private', self.authorized_client.get(url)['Cache-Control'])
+        self.assertIn(
+            'public', self.guest_client.get('/api/tags/')['Cache-Control'])
+
+    def test_recipe_etag_depends_on_viewer(self):
+        """ETag рецепта меняется при изменении рецепта и избранного."""
+        url = '/api/recipes/%s/' % self.recipe.id
+        response = self.authorized_client.get(url)
+        etag = response['ETag']
+        self.assertFalse(response.data['is_favorited'])
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+        etag = response['ETag']
+        self.recipe.tags.clear()
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['tags'], [])
+
+    def test_missing_recipe(self):
+        """Для несуществующего рецепта возвращается 404 без ETag."""
+        response = self.guest_client.get('/api/recipes/0/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
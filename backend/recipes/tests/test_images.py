@@ -0,0 +1,289 @@
+import hashlib
+import io
+import shutil
+import tempfile
+from base64 import b64encode
+from unittest import mock
+
+from api.fields import Base64ImageField, decode_base64_image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from ..images import rendition_name
+from ..models import Ingredient, Recipe, Tag
+from .utils import IMAGE
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(size=(1, 1), format='PNG'):
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(buffer, format)
+    return buffer.getvalue()
+
+
+def to_data_url(content, mime='image/png'):
+    return 'data:{};base64,{}'.format(mime, b64encode(content).decode())
+
+
+class ImageSerializer(serializers.Serializer):
+    image = Base64ImageField()
+
+
+def get_error_code(data):
+    serializer = ImageSerializer(data={'image': data})
+    serializer.is_valid()
+    return serializer.errors['image'][0].code
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    def test_decode(self):
+        """Картинка декодируется в файл с расширением по сигнатуре."""
+        content = make_image((300, 200), 'JPEG')
+        image = Base64ImageField().run_validation(
+            to_data_url(content, 'image/png'))
+        self.assertEqual(image.name, 'image.jpg')
+        self.assertEqual(image.size, len(content))
+        self.assertEqual(image.read(), content)
+        self.assertEqual(image.image.size, (300, 200))
+
+    def test_small_image(self):
+        image = Base64ImageField().run_validation(IMAGE)
+        self.assertEqual(image.name, 'image.png')
+
+    def test_max_size_checked_before_decoding(self):
+        """Слишком большая картинка отклоняется до декодирования."""
+        content = make_image((100, 100))
+        with mock.patch('api.fields.b64decode') as b64decode:
+            with self.assertRaises(ValidationError) as context:
+                decode_base64_image(to_data_url(content), len(content) - 1)
+        b64decode.assert_not_called()
+        self.assertEqual(context.exception.detail[0].code, 'max_size')
+        image = decode_base64_image(to_data_url(content), len(content))
+        self.assertEqual(image.size, len(content))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_image_spooled_to_disk(self):
+        """Картинка больше порога декодируется во временный файл."""
+        content = make_image((300, 300))
+        self.assertGreater(len(content), 1024)
+        image = Base64ImageField().run_validation(to_data_url(content))
+        self.assertTrue(image.file._rolled)
+        self.assertEqual(image.read(), content)
+
+    def test_line_wrapped_data(self):
+        """
+        Переносы строк и пробелы в base64 не учитываются
+        ни в размере, ни при декодировании.
+        """
+        content = make_image((100, 100))
+        encoded = b64encode(content).decode()
+        wrapped = '\r\n'.join(
+            encoded[start:start + 76]
+            for start in range(0, len(encoded), 76))
+        self.assertGreater(len(encoded) // 76, 1)
+        image = decode_base64_image(
+            'data:image/png;base64,' + wrapped + '\n', len(content))
+        self.assertEqual(image.size, len(content))
+        self.assertEqual(image.read(), content)
+        image = Base64ImageField().run_validation(
+            'data:image/png;base64, ' + encoded[:70] + ' \n' + encoded[70:])
+        self.assertEqual(image.image.size, (100, 100))
+
+    def test_invalid_data(self):
+        """Ошибки формата и строки base64."""
+        for data, code in (
+            (to_data_url(b'not an image at all'), 'format'),
+            ('data:image/png;base64,iVBORw0KGgo!AAA', 'invalid'),
+            ('data:image/png;base64,iVBORw0KGgoA', 'invalid_image'),
+            ('data:image/png,iVBORw0KGgo', 'invalid'),
+            ('data:image/png;base64,', 'empty'),
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(get_error_code(data), code)
+
+    def test_corrupted_image(self):
+        """Картинка с верной сигнатурой, но поврежденная, отклоняется."""
+        content = make_image((50, 50))[:60]
+        self.assertEqual(
+            get_error_code(to_data_url(content)), 'invalid_image')
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_max_pixels(self):
+        """Число пикселей ограничено независимо от размера файла."""
+        self.assertEqual(
+            get_error_code(to_data_url(make_image((11, 10)))), 'max_pixels')
+        image = Base64ImageField().run_validation(
+            to_data_url(make_image((10, 10))))
+        self.assertEqual(image.image.size, (10, 10))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeImagePipelineTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com')
+
+    def create_recipe(self, image):
+        return Recipe.objects.create(
+            author=self.user,
+            name='Рецепт',
+            text='Текст',
+            cooking_time=10,
+            image=image,
+        )
+
+    def test_original_processed_on_save(self):
+        """Оригинал уменьшается и перекодируется, копии создаются."""
+        recipe = self.create_recipe(ContentFile(
+            make_image((2400, 1200), 'PNG'), name='photo.png'))
+        self.assertTrue(recipe.image.name.endswith('.webp'))
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (1600, 800))
+        for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+            name = rendition_name(recipe.image.name, rendition)
+            with Image.open(recipe.image.storage.path(name)) as image:
+                self.assertEqual(image.size, size)
+
+    def test_truncated_image_in_api(self):
+        """
+        Обрезанный JPEG проходит Image.verify(), но не декодируется:
+        создание и изменение рецепта возвращают ошибку валидации.
+        """
+        content = make_image((300, 200), 'JPEG')
+        tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='Продукт', measurement_unit='г')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = {
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+            'name': 'Рецепт',
+            'image': to_data_url(content[:len(content) // 2], 'image/jpeg'),
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+        response = client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'][0].code, 'invalid_image')
+        recipe = self.create_recipe('')
+        response = client.patch(
+            '/api/recipes/%s/' % recipe.id, {'image': data['image']},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['image'][0].code, 'invalid_image')
+
+    def test_rendition_urls_in_api(self):
+        """Ссылки на копии выводятся в рецепте."""
+        recipe = self.create_recipe(ContentFile(
+            make_image((400, 400), 'JPEG'), name='photo.jpg'))
+        response = APIClient().get('/api/recipes/%s/' % recipe.id)
+        renditions = response.data['image_renditions']
+        self.assertEqual(
+            set(renditions), set(settings.RECIPE_IMAGE_RENDITIONS))
+        self.assertTrue(renditions['small'].startswith('http://testserver/'))
+        self.assertIn('/renditions/', renditions['small'])
+
+    def test_backfill_command(self):
+        """Команда обрабатывает ранее загруженные картинки."""
+        recipe = self.create_recipe('')
+        name = default_storage.save(
+            'recipes/images/old.png',
+            ContentFile(make_image((2000, 500), 'PNG')))
+        Recipe.objects.filter(id=recipe.id).update(image=name)
+        call_command('process_recipe_images', stdout=io.StringIO())
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image.name.endswith('.webp'))
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual(image.size, (1600, 400))
+        self.assertTrue(default_storage.exists(
+            rendition_name(recipe.image.name, 'small')))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeImageStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.content = make_image((64, 64))
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_recipe(self, content):
+        return Recipe.objects.create(
+            author=self.user,
+            name='Рецепт',
+            text='Текст',
+            cooking_time=10,
+            image=ContentFile(content, name='temp.png'),
+        )
+
+    def collect(self, *args):
+        call_command(
+            'collect_recipe_images', '--min-age=0', *args,
+            stdout=io.StringIO())
+
+    def test_identical_images_share_file(self):
+        """Одинаковые картинки хранятся одним файлом с именем по хешу."""
+        first = self.create_recipe(self.content)
+        second = self.create_recipe(self.content)
+        self.assertEqual(first.image.name, second.image.name)
+        with first.image.open('rb'):
+            digest = hashlib.sha256(first.image.read()).hexdigest()
+        self.assertEqual(
+            first.image.name, 'recipes/images/{}.webp'.format(digest))
+        self.assertEqual(
+            len(default_storage.listdir('recipes/images')[1]), 1)
+
+    def test_collect_orphans(self):
+        """Удаляются только картинки без ссылок и их копии."""
+        first = self.create_recipe(self.content)
+        second = self.create_recipe(self.content)
+        other = self.create_recipe(make_image((32, 32)))
+        orphan = other.image.name
+        other.delete()
+        self.collect('--dry-run')
+        self.assertTrue(default_storage.exists(orphan))
+        self.collect()
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(
+            default_storage.exists(rendition_name(orphan, 'small')))
+        first.delete()
+        self.collect()
+        self.assertTrue(default_storage.exists(second.image.name))
+        self.assertTrue(default_storage.exists(
+            rendition_name(second.image.name, 'small')))
+
+    def test_recent_files_kept(self):
+        """Недавно сохраненные файлы не удаляются."""
+        recipe = self.create_recipe(self.content)
+        name = recipe.image.name
+        recipe.delete()
+        call_command('collect_recipe_images', stdout=io.StringIO())
+        self.assertTrue(default_storage.exists(name))
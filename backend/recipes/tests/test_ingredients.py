@@ -0,0 +1,100 @@
+from api.serializers import IngredientSerializer
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from ..models import Ingredient
+from ..search import ingredient_index
+from ..versions import INGREDIENTS_KEY, incr_version
+
+INGREDIENTS = (
+    ('Сахар', 'г'),
+    ('сахарная пудра', 'г'),
+    ('Ванильный сахар', 'г'),
+    ('Соль', 'г'),
+    ('молоко', 'мл'),
+    ('Мука', 'г'),
+)
+
+
+class IngredientIndexTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in INGREDIENTS
+        )
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        self.client = APIClient()
+
+    def test_response_matches_serializer(self):
+        """
+        Ответ индекса в режиме по умолчанию (prefix) совпадает
+        с выдачей IngredientSerializer.
+        SQLite не приводит кириллицу к одному регистру в LIKE,
+        поэтому ожидаемый результат отбирается в Python.
+        """
+        for prefix in ('', 'с', 'СА', 'сахар', 'м', 'нет'):
+            with self.subTest(prefix=prefix):
+                expected = IngredientSerializer(
+                    [ingredient for ingredient in Ingredient.objects.all()
+                     if ingredient.name.lower().startswith(prefix.lower())],
+                    many=True
+                ).data
+                response = self.client.get(
+                    '/api/ingredients/', {'name': prefix})
+                self.assertEqual(
+                    response.content, JSONRenderer().render(expected))
+
+    @override_settings(INGREDIENT_SEARCH_MODE='ranked')
+    def test_ranked_search(self):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        response = self.client.get('/api/ingredients/', {'name': 'сахар'})
+        self.assertEqual(
+            [item['name'] for item in response.data],
+            ['Сахар', 'сахарная пудра', 'Ванильный сахар']
+        )
+
+    @override_settings(
+        INGREDIENT_SEARCH_MODE='ranked', INGREDIENT_SEARCH_LIMIT=2)
+    def test_ranked_search_limit(self):
+        """Выдача ограничена INGREDIENT_SEARCH_LIMIT."""
+        response = self.client.get('/api/ingredients/', {'name': 'с'})
+        self.assertEqual(
+            [item['name'] for item in response.data],
+            ['Сахар', 'Соль']
+        )
+
+    def test_search_without_queries(self):
+        """Прогретый индекс не обращается к базе данных."""
+        ingredient_index.search('')
+        with self.assertNumQueries(0):
+            self.client.get('/api/ingredients/', {'name': 'сах'})
+
+    def test_index_invalidated_on_change(self):
+        """Изменение продуктов сбрасывает индекс."""
+        self.assertEqual(ingredient_index.search('мёд'), [])
+        honey = Ingredient.objects.create(name='Мёд', measurement_unit='г')
+        self.assertEqual(
+            [row['id'] for row in ingredient_index.search('мёд')],
+            [honey.id]
+        )
+        honey.delete()
+        self.assertEqual(ingredient_index.search('мёд'), [])
+
+    def test_reload_on_version_change(self):
+        """
+        Изменение в другом процессе видно по версии продуктов в кеше:
+        ответ с новым ETag строится по перезагруженному индексу.
+        """
+        ingredient_index.search('')
+        etag = self.client.get('/api/ingredients/')['ETag']
+        Ingredient.objects.filter(name='Соль').update(name='Перец')
+        incr_version(INGREDIENTS_KEY)
+        response = self.client.get('/api/ingredients/', {'name': 'пер'})
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            [item['name'] for item in response.data], ['Перец'])
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ..models import Favorite, Recipe, RecipeRanking, RecipeRankingState
+from ..ranking import refresh
+
+User = get_user_model()
+
+
+class PopularRecipesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com')
+        cls.users = [
+            User.objects.create_user(
+                username='user%s' % i, email='user%s@example.com' % i)
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.other if i == 3 else cls.author,
+                name='Рецепт %s' % i, text='Текст', cooking_time=10)
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def favorite(self, recipe, users, days=0):
+        for user in users:
+            Favorite.objects.create(
+                user=user, recipe=recipe,
+                created=timezone.now() - timedelta(days=days))
+
+    def popular(self, **params):
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'popular', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def ids(self, *indexes):
+        return [self.recipes[index].id for index in indexes]
+
+    def test_rankings_for_new_recipes(self):
+        """У каждого нового рецепта есть строка популярности."""
+        self.assertEqual(RecipeRanking.objects.count(), len(self.recipes))
+
+    def test_decayed_order(self):
+        """
+        Свежее добавление весит больше двух добавлений десятидневной
+        давности, добавления за пределами окна не учитываются.
+        """
+        self.favorite(self.recipes[0], self.users[:2], days=10)
+        self.favorite(self.recipes[1], self.users[:1])
+        self.favorite(self.recipes[2], self.users, days=40)
+        refresh(full=True)
+        self.assertEqual(self.popular(), self.ids(1, 0, 3, 2))
+
+    def test_incremental_refresh(self):
+        """Обновление учитывает только новые добавления."""
+        self.favorite(self.recipes[0], self.users[:1])
+        refresh()
+        state = RecipeRankingState.objects.get()
+        self.assertEqual(
+            state.last_favorite_id, Favorite.objects.get().id)
+        self.favorite(self.recipes[2], self.users[:2])
+        self.assertEqual(refresh(), 1)
+        self.assertEqual(self.popular(), self.ids(2, 0, 3, 1))
+
+    def test_full_refresh_removes_deleted(self):
+        """Полный пересчет убирает удаленные добавления."""
+        self.favorite(self.recipes[0], self.users[:2])
+        self.favorite(self.recipes[1], self.users[:1])
+        refresh()
+        Favorite.objects.filter(recipe=self.recipes[0]).delete()
+        refresh()
+        self.assertEqual(self.popular()[0], self.recipes[0].id)
+        refresh(full=True)
+        self.assertEqual(self.popular(), self.ids(1, 3, 2, 0))
+
+    def test_favorites_without_date_skipped(self):
+        """
+        Добавления, сделанные до появления даты (created IS NULL),
+        в популярности не учитываются.
+        """
+        self.favorite(self.recipes[0], self.users)
+        self.favorite(self.recipes[1], self.users[:1])
+        Favorite.objects.filter(recipe=self.recipes[0]).update(created=None)
+        refresh(full=True)
+        self.assertEqual(self.popular(), self.ids(1, 3, 2, 0))
+        self.assertEqual(
+            RecipeRanking.objects.get(recipe=self.recipes[0]).score, 0)
+
+    def test_with_filters(self):
+        """Сортировка работает вместе с фильтрами и пагинацией."""
+        self.favorite(self.recipes[3], self.users[:1])
+        self.favorite(self.recipes[1], self.users[:2])
+        refresh()
+        self.assertEqual(
+            self.popular(author=self.author.id), self.ids(1, 2, 0))
+        self.assertEqual(self.popular(limit=2), self.ids(1, 3))
+        self.assertEqual(self.popular(limit=2, page=2), self.ids(2, 0))
+
+    def test_unknown_ordering(self):
+        """Неизвестная сортировка - ошибка валидации."""
+        response = self.client.get('/api/recipes/', {'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
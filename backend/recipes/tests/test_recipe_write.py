@@ -0,0 +1,248 @@
+import shutil
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import Ingredient, Recipe, ShoppingCart, Tag
+from .utils import IMAGE
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+INGREDIENTS_NUMBER = 30
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tags = [
+            Tag.objects.create(
+                name='Тег %s' % i, color='#00000%s' % i, slug='tag%s' % i)
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name='Продукт %s' % i, measurement_unit='г')
+            for i in range(INGREDIENTS_NUMBER)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, ingredients, tags):
+        return {
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in ingredients
+            ],
+            'name': 'Рецепт',
+            'image': IMAGE,
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+    def count_queries(self, method, url, data):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertIn(response.status_code, (200, 201), response.data)
+        return response, len(context.captured_queries)
+
+    def test_create_queries_do_not_depend_on_size(self):
+        """Создание рецепта - ограниченное число запросов."""
+        # Первый запрос загружает реестр тегов и не учитывается.
+        counts = [
+            self.count_queries(
+                'post', '/api/recipes/',
+                self.get_data(ingredients, self.tags[:len(ingredients)])
+            )[1]
+            for ingredients in (
+                self.ingredients[:1],
+                self.ingredients[:1],
+                self.ingredients[:3],
+                self.ingredients,
+            )
+        ][1:]
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_update_queries_do_not_depend_on_size(self):
+        """
+        Обновление рецепта - ограниченное число запросов: удаление,
+        добавление и изменение количества 1 и 29 продуктов равноценны.
+        """
+        counts = {}
+        for size in (2, INGREDIENTS_NUMBER):
+            response, _ = self.count_queries(
+                'post', '/api/recipes/',
+                self.get_data(self.ingredients[:size], self.tags))
+            url = '/api/recipes/%s/' % response.data['id']
+            ShoppingCart.objects.create(
+                user=self.user, recipe_id=response.data['id'])
+            changed = self.get_data(self.ingredients[:size], self.tags)
+            for ingredient in changed['ingredients']:
+                ingredient['amount'] = 20
+            counts[size] = [
+                self.count_queries('patch', url, data)[1]
+                for data in (
+                    self.get_data(self.ingredients[:1], self.tags),
+                    self.get_data(self.ingredients[:size], self.tags),
+                    changed,
+                )
+            ]
+        self.assertEqual(counts[2], counts[INGREDIENTS_NUMBER], counts)
+
+    def test_all_missing_ingredients_reported(self):
+        """Ошибка перечисляет все несуществующие продукты."""
+        data = self.get_data(self.ingredients[:3], self.tags)
+        data['ingredients'][0]['id'] = 0
+        data['ingredients'][2]['id'] = -1
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['ingredients']
+        self.assertIn('id', errors[0])
+        self.assertEqual(errors[1], {})
+        self.assertIn('id', errors[2])
+        self.assertEqual(
+            sum('recipes_ingredient' in query['sql']
+                for query in context.captured_queries),
+            1
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_changes_only_differences(self):
+        """Обновление меняет только отличающиеся продукты и теги."""
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_data(self.ingredients[:3], self.tags[:2]),
+            format='json'
+        )
+        recipe = Recipe.objects.get(id=response.data['id'])
+        rows = {
+            row.ingredient_id: row.id
+            for row in recipe.ingredient_amount.all()
+        }
+        data = self.get_data(
+            self.ingredients[1:4], [self.tags[0], self.tags[2]])
+        data['ingredients'][0]['amount'] = 25
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                '/api/recipes/%s/' % recipe.id, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        amounts = {
+            row.ingredient_id: (row.id, row.amount)
+            for row in recipe.ingredient_amount.all()
+        }
+        first, second, third, fourth = (
+            ingredient.id for ingredient in self.ingredients[:4])
+        self.assertNotIn(first, amounts)
+        self.assertEqual(amounts[second], (rows[second], 25))
+        self.assertEqual(amounts[third], (rows[third], 10))
+        self.assertEqual(amounts[fourth][1], 10)
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {self.tags[0].id, self.tags[2].id}
+        )
+        writes = [
+            query['sql'].split()[0] for query in context.captured_queries
+            if 'recipeingredientdetails' in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT', 'UPDATE'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@skipUnlessDBFeature('has_select_for_update')
+class RecipeConcurrentUpdateTest(TransactionTestCase):
+    threads_number = 8
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='author', email='author@example.com')
+        self.tag = Tag.objects.create(
+            name='Тег', color='#000000', slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name='Продукт %s' % i, measurement_unit='г')
+            for i in range(self.threads_number + 2)
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Текст', cooking_time=10)
+        self.recipe.tags.add(self.tag)
+
+    def get_data(self, number):
+        # У каждого потока свой набор продуктов, частично
+        # пересекающийся с наборами остальных потоков.
+        return {
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': number + 1}
+                for ingredient in self.ingredients[number:number + 3]
+            ],
+            'name': 'Рецепт %s' % number,
+            'image': IMAGE,
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+    def update(self, number, barrier, statuses):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        barrier.wait()
+        try:
+            response = client.patch(
+                '/api/recipes/%s/' % self.recipe.id,
+                self.get_data(number), format='json')
+            statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    def test_concurrent_updates(self):
+        """
+        Одновременные обновления не смешивают продукты рецепта:
+        итог совпадает с данными одного из запросов.
+        """
+        barrier = threading.Barrier(self.threads_number)
+        statuses = []
+        threads = [
+            threading.Thread(
+                target=self.update, args=(number, barrier, statuses))
+            for number in range(self.threads_number)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(statuses, [200] * self.threads_number)
+        self.recipe.refresh_from_db()
+        number = int(self.recipe.name.split()[-1])
+        expected = {
+            (item['id'], item['amount'])
+            for item in self.get_data(number)['ingredients']
+        }
+        rows = list(self.recipe.ingredient_amount.values_list(
+            'ingredient_id', 'amount'))
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(set(rows), expected)
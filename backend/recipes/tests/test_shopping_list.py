@@ -0,0 +1,155 @@
+import csv
+import json
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import Ingredient, Recipe, RecipeIngredientDetails, ShoppingCart
+
+User = get_user_model()
+INGREDIENTS_NUMBER = 60
+
+
+class ShoppingListDownloadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com')
+        recipes = [
+            Recipe.objects.create(
+                author=cls.user,
+                name='Рецепт %s' % i,
+                text='Текст %s' % i,
+                cooking_time=10,
+            )
+            for i in range(2)
+        ]
+        Ingredient.objects.bulk_create(
+            Ingredient(name='Продукт %02d' % i, measurement_unit='г')
+            for i in range(INGREDIENTS_NUMBER)
+        )
+        ingredients = Ingredient.objects.all()
+        for recipe in recipes:
+            RecipeIngredientDetails.objects.bulk_create(
+                RecipeIngredientDetails(
+                    recipe=recipe, ingredient=ingredient, amount=10)
+                for ingredient in ingredients
+            )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, **kwargs):
+        return self.client.get(
+            '/api/recipes/download_shopping_cart/', **kwargs)
+
+    def test_pdf(self):
+        """
+        PDF собирается целиком и отдается обычным ответом,
+        текстовые форматы - потоком.
+        """
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertTrue(self.download(data={'format': 'txt'}).streaming)
+
+    def test_pdf_breaks_pages(self):
+        """Длинный список переносится на следующие страницы."""
+        content = self.download().content
+        pages = re.findall(rb'/Type /Page\b', content)
+        self.assertGreater(len(pages), 1)
+
+    def test_text_formats(self):
+        """Текстовые форматы выбираются параметром format."""
+        for format, content_type in (('txt', 'text/plain'),
+                                     ('csv', 'text/csv'),
+                                     ('json', 'application/json')):
+            with self.subTest(format=format):
+                response = self.download(data={'format': format})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type))
+                self.assertIn(
+                    'shopping_cart.%s' % format,
+                    response['Content-Disposition']
+                )
+
+    def test_format_from_accept_header(self):
+        """Формат выбирается по заголовку Accept."""
+        response = self.download(HTTP_ACCEPT='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+    def test_formats_content(self):
+        """Все форматы содержат одинаковые суммарные количества."""
+        content = b''.join(
+            self.download(data={'format': 'json'}).streaming_content)
+        items = json.loads(content)
+        self.assertEqual(len(items), INGREDIENTS_NUMBER)
+        self.assertEqual(
+            items[0],
+            {'name': 'Продукт 00', 'measurement_unit': 'г', 'amount': 20}
+        )
+        content = b''.join(
+            self.download(data={'format': 'csv'}).streaming_content)
+        rows = list(csv.reader(content.decode().splitlines()))
+        self.assertEqual(len(rows), INGREDIENTS_NUMBER + 1)
+        self.assertEqual(rows[1], ['Продукт 00', '20', 'г'])
+        content = b''.join(
+            self.download(data={'format': 'txt'}).streaming_content)
+        self.assertEqual(
+            content.decode().splitlines()[0], 'Продукт 00 (г) — 20')
+
+    def test_repeat_download_is_cached(self):
+        """Повторная выгрузка берется из кеша без запросов к базе."""
+        first = self.download().content
+        with self.assertNumQueries(0):
+            response = self.download()
+        self.assertEqual(response.content, first)
+        first = b''.join(
+            self.download(data={'format': 'csv'}).streaming_content)
+        with self.assertNumQueries(0):
+            response = self.download(data={'format': 'csv'})
+        self.assertEqual(response.content, first)
+
+    def test_cache_reset_on_cart_change(self):
+        """Изменение корзины или ее рецептов сбрасывает кеш."""
+        self.download(data={'format': 'txt'}).getvalue()
+        recipe = Recipe.objects.create(
+            author=self.user, name='Новый', text='Текст', cooking_time=5)
+        RecipeIngredientDetails.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='Ягоды', measurement_unit='г'),
+            amount=5
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        content = self.download(data={'format': 'txt'}).getvalue()
+        self.assertIn('Ягоды (г) — 5', content.decode())
+        details = recipe.ingredient_amount.get()
+        details.amount = 7
+        details.save()
+        content = self.download(data={'format': 'txt'}).getvalue()
+        self.assertIn('Ягоды (г) — 7', content.decode())
+
+    def test_guest_has_no_access(self):
+        """
+        Анонимный пользователь не может скачать список,
+        ошибка выводится в JSON в любом формате.
+        """
+        self.client.force_authenticate(None)
+        for format in ('pdf', 'txt', 'csv', 'json'):
+            with self.subTest(format=format):
+                response = self.download(data={'format': format})
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json')
+                self.assertIn('detail', json.loads(response.content))
@@ -0,0 +1,161 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..models import Ingredient, Recipe, Tag
+from ..tags import tag_registry
+from ..versions import TAGS_KEY, get_versions, incr_version
+from .utils import IMAGE
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class TagRegistryTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tags = [
+            Tag.objects.create(
+                name='Тег %s' % i, color='#00000%s' % i, slug='tag%s' % i)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        tag_registry.invalidate()
+        self.client = APIClient()
+
+    def test_tags_without_queries(self):
+        """Загруженные теги отдаются без запросов к базе данных."""
+        tag_registry.all()
+        with self.assertNumQueries(0):
+            list_response = self.client.get('/api/tags/')
+            detail_response = self.client.get(
+                '/api/tags/%s/' % self.tags[0].id)
+        self.assertEqual(
+            [item['slug'] for item in list_response.data],
+            ['tag0', 'tag1', 'tag2']
+        )
+        self.assertEqual(detail_response.data, {
+            'id': self.tags[0].id,
+            'name': 'Тег 0',
+            'color': '#000000',
+            'slug': 'tag0',
+        })
+
+    def test_unknown_tag(self):
+        """Несуществующий тег - 404."""
+        for pk in (0, 'slug'):
+            with self.subTest(pk=pk):
+                response = self.client.get('/api/tags/%s/' % pk)
+                self.assertEqual(response.status_code, 404)
+
+    def test_reload_on_save(self):
+        """Сохранение тега обновляет реестр."""
+        tag_registry.all()
+        self.tags[1].name = 'Новое название'
+        self.tags[1].save()
+        self.assertEqual(
+            tag_registry.get(self.tags[1].id)['name'], 'Новое название')
+
+    def test_reload_on_version_change(self):
+        """
+        Изменение в другом процессе видно по версии тегов в кеше
+        после интервала сверки, а в списке тегов - сразу.
+        """
+        tag_registry.all()
+        Tag.objects.filter(id=self.tags[2].id).update(slug='changed')
+        incr_version(TAGS_KEY)
+        self.assertIn('tag2', tag_registry.slug_map())
+        with override_settings(VERSION_CHECK_INTERVAL=0):
+            self.assertIn('changed', tag_registry.slug_map())
+            self.assertNotIn('tag2', tag_registry.slug_map())
+        Tag.objects.filter(id=self.tags[2].id).update(slug='again')
+        incr_version(TAGS_KEY)
+        response = self.client.get('/api/tags/')
+        self.assertIn('again', [item['slug'] for item in response.data])
+
+    @override_settings(VERSION_CHECK_INTERVAL=5)
+    def test_reload_after_interval(self):
+        """
+        Другой процесс меняет тег в базе без сигналов и увеличивает
+        версию прямо в кеше: реестр перезагружается, когда истекает
+        VERSION_CHECK_INTERVAL.
+        """
+        now = 1000.0
+        with mock.patch('recipes.versions.time.monotonic',
+                        side_effect=lambda: now):
+            self.assertIn('tag2', tag_registry.slug_map())
+            Tag.objects.filter(id=self.tags[2].id).update(slug='changed')
+            cache.incr(TAGS_KEY)
+            now += 4
+            self.assertIn('tag2', tag_registry.slug_map())
+            now += 2
+            self.assertIn('changed', tag_registry.slug_map())
+            self.assertNotIn('tag2', tag_registry.slug_map())
+
+    def test_version_checked_once_per_interval(self):
+        """Обращения к реестру внутри интервала не ходят в кеш."""
+        tag_registry.all()
+        with mock.patch(
+            'recipes.versions.get_versions', wraps=get_versions
+        ) as patched:
+            for tag in self.tags * 10:
+                tag_registry.get(tag.id)
+                tag_registry.slug_map()
+        self.assertEqual(patched.call_count, 0)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeTagsValidationTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com')
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='Продукт', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        tag_registry.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, tags):
+        return self.client.post('/api/recipes/', {
+            'tags': tags,
+            'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+            'name': 'Рецепт',
+            'image': IMAGE,
+            'text': 'Текст',
+            'cooking_time': 10,
+        }, format='json')
+
+    def test_tags_from_registry(self):
+        """Теги рецепта проверяются и выводятся по реестру."""
+        response = self.create_recipe([self.tag.id])
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['tags'][0]['slug'], 'tag')
+        recipe = Recipe.objects.get(id=response.data['id'])
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+
+    def test_unknown_tag(self):
+        """Несуществующий тег - ошибка валидации."""
+        for tags in ([self.tag.id + 1], ['tag'], [True]):
+            with self.subTest(tags=tags):
+                response = self.create_recipe(tags)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('tags', response.data)
@@ -0,0 +1,36 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Картинка 1x1 PNG в формате, который присылает фронтенд.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAAD'
+    'ElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+)
+
+
+class QueryCountMixin:
+    """
+    Проверки количества SQL-запросов для TestCase.
+    """
+
+    def count_queries(self, client, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(context.captured_queries)
+
+    def assertQueryCountFlat(self, client, url, param, values, params=None):
+        """
+        Количество запросов к url не растет вместе со значением param,
+        например с limit для постраничного списка.
+        Первый запрос прогревает кеши (например, count страниц).
+        """
+        self.count_queries(client, url, {**(params or {}), param: values[0]})
+        counts = {}
+        for value in values:
+            counts[value] = self.count_queries(
+                client, url, {**(params or {}), param: value})
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            'Количество запросов зависит от %s: %s' % (param, counts)
+        )
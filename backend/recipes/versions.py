@@ -0,0 +1,149 @@
+"""
+Счетчики версий данных в кеше Django.
+Версия входит в ключи закешированных данных и увеличивается
+при изменениях, так что устаревшие записи больше не читаются.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ShoppingCart
+
+INGREDIENTS_KEY = 'version:ingredients'
+TAGS_KEY = 'version:tags'
+RECIPE_KEY = 'version:recipe:{}'
+SHOPPING_LIST_KEY = 'version:shopping_list:{}'
+# Профиль пользователя, который выводится автором рецепта.
+USER_KEY = 'version:user:{}'
+# Избранное, корзина и подписки пользователя.
+VIEWER_KEY = 'version:viewer:{}'
+
+_deferred = threading.local()
+
+
+def initial_version():
+    # Счетчик, вытесненный из кеша, не должен начаться
+    # с уже использованного значения.
+    return time.time_ns()
+
+
+def get_versions(*keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key, initial_version())
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return get_versions(key)[0]
+
+
+def incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), None)
+
+
+def bump_version(key):
+    """
+    Увеличивает версию сразу и повторно после фиксации транзакции,
+    чтобы данные, прочитанные до фиксации, не остались актуальными.
+    """
+    if getattr(_deferred, 'keys', None) is not None:
+        _deferred.keys.add(key)
+        return
+    incr_version(key)
+    transaction.on_commit(lambda: incr_version(key))
+
+
+def bump_shopping_list(user_id):
+    bump_version(SHOPPING_LIST_KEY.format(user_id))
+
+
+def bump_recipe_shopping_lists(recipe_id):
+    """
+    Сбрасывает списки покупок всех пользователей с рецептом в корзине.
+    """
+    if getattr(_deferred, 'recipes', None) is not None:
+        _deferred.recipes.add(recipe_id)
+        return
+    for user_id in ShoppingCart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True):
+        bump_shopping_list(user_id)
+
+
+@contextmanager
+def deferred_bumps():
+    """
+    Внутри блока версии и списки покупок рецептов не сбрасываются,
+    а запоминаются и сбрасываются по одному разу при выходе:
+    сигналы от множества строк не дают запросов на каждую строку.
+    """
+    if getattr(_deferred, 'keys', None) is not None:
+        yield
+        return
+    _deferred.keys, _deferred.recipes = set(), set()
+    try:
+        yield
+    finally:
+        keys, recipes = _deferred.keys, _deferred.recipes
+        _deferred.keys = _deferred.recipes = None
+    for recipe_id in recipes:
+        bump_recipe_shopping_lists(recipe_id)
+    for key in keys:
+        bump_version(key)
+
+
+class VersionedRegistry:
+    """
+    Данные в памяти процесса, загруженные вместе с версией version_key.
+    В этом процессе данные сбрасываются сигналами, изменения
+    в остальных процессах видны по версии в кеше. Версия сверяется
+    не чаще раза в VERSION_CHECK_INTERVAL секунд, чтобы обращения
+    к данным не ходили в общий кеш; current_version() сверяет ее сразу.
+    Подклассы задают version_key и метод _load().
+    """
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._checked = 0
+
+    def _refresh(self, version):
+        with self._lock:
+            if self._data is None or self._data[0] != version:
+                self._data = (version, self._load())
+            self._checked = time.monotonic()
+            return self._data
+
+    def _get(self):
+        data = self._data
+        if (data is not None and time.monotonic() - self._checked
+                < settings.VERSION_CHECK_INTERVAL):
+            return data[1]
+        return self._refresh(get_version(self.version_key))[1]
+
+    def current_version(self):
+        """Версия из кеша; данные перезагружаются, если она изменилась."""
+        return self._refresh(get_version(self.version_key))[0]
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def invalidate_on_commit(self):
+        """
+        Сбрасывает данные сразу и повторно после фиксации транзакции,
+        чтобы не закешировать незафиксированные данные.
+        """
+        self.invalidate()
+        transaction.on_commit(self.invalidate)
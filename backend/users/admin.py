@@ -9,7 +9,9 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
-        'role'
+        'role',
+        'recipes_count',
+        'followers_count',
     )
     list_filter = ('email', 'username')
 
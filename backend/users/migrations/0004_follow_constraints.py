@@ -0,0 +1,39 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+import django.db.models.expressions
+
+
+def remove_invalid_follows(apps, schema_editor):
+    """
+    Удаляет подписки на себя, из повторяющихся подписок
+    остается первая.
+    """
+    Follow = apps.get_model('users', 'Follow')
+    Follow.objects.filter(user=F('author')).delete()
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        first_id=Min('id'), count=Count('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        Follow.objects.filter(
+            user=duplicate['user'], author=duplicate['author']
+        ).exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20221221_0505'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_invalid_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent_self_follow'),
+        ),
+    ]
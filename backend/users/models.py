@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from foodgram_project.db.managers import RawSQLManager
 
 
 class User(AbstractUser):
@@ -50,6 +52,16 @@ class User(AbstractUser):
         max_length=100,
         null=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        editable=False,
+    )
 
     REQUIRED_FIELDS = [
         'email',
@@ -74,6 +86,42 @@ class User(AbstractUser):
         return self.role == 'user'
 
 
+class FollowManager(RawSQLManager):
+    """
+    Подписка и отписка одним запросом.
+    """
+    tables = {'user': User}
+
+    def follow(self, user_id, author_id):
+        """
+        INSERT ... ON CONFLICT DO NOTHING. Возвращает False, если
+        подписка уже есть или автора не существует.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = self.execute(
+                'INSERT INTO {table} (user_id, author_id) '
+                'SELECT %s, id FROM {user} WHERE id = %s '
+                'ON CONFLICT (user_id, author_id) DO NOTHING',
+                [user_id, author_id]
+            ) > 0
+            if created:
+                self.send_created(
+                    self.model(user_id=user_id, author_id=author_id))
+        return created
+
+    def unfollow(self, user_id, author_id):
+        """Один DELETE. Возвращает False, если подписки не было."""
+        with transaction.atomic(using=self.db, savepoint=False):
+            deleted = self.execute(
+                'DELETE FROM {table} WHERE user_id = %s AND author_id = %s',
+                [user_id, author_id]
+            ) > 0
+            if deleted:
+                self.send_deleted(
+                    self.model(user_id=user_id, author_id=author_id))
+        return deleted
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -88,10 +136,18 @@ class Follow(models.Model):
         verbose_name='Автор',
     )
 
+    objects = FollowManager()
+
     class Meta:
         ordering = ['-author_id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+            models.CheckConstraint(
+                check=~Q(user=F('author')), name='prevent_self_follow'),
+        ]
 
     def __str__(self):
         return f"{self.user} подписан на {self.author}"
@@ -1,3 +1,4 @@
+from api.fields import ImageRenditionsField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from recipes.models import Recipe
 from rest_framework import serializers
@@ -58,16 +59,31 @@ class CustomUserSerializers(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=user, author=obj.id).exists()
 
 
+def get_recipes_limit(request):
+    """
+    Значение параметра recipes_limit или None, если он не задан.
+    """
+    try:
+        limit = int(request.query_params.get('recipes_limit', ''))
+    except ValueError:
+        return None
+    return limit if limit >= 0 else None
+
+
 class FollowRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализация рецептов для FollowSerializer.
     """
+    image_renditions = ImageRenditionsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -78,11 +94,11 @@ class FollowSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='author.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True
-    )
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if self.context['request'].user.is_anonymous:
             return False
@@ -90,10 +106,11 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
+        limit = get_recipes_limit(request)
+        # Если рецепты авторов загружены заранее, срез берется из кеша.
+        queryset = obj.author.recipes.all()
+        if limit is not None:
+            queryset = queryset[:limit]
         return FollowRecipeSerializer(queryset, many=True).data
 
     class Meta:
@@ -0,0 +1,137 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from recipes.models import Recipe
+from recipes.tests.utils import QueryCountMixin
+from rest_framework.test import APIClient
+
+from ..models import Follow, User
+
+AUTHORS_NUMBER = 8
+RECIPES_NUMBER = 5
+
+
+class SubscriptionsTest(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='follower', email='follower@example.com')
+        for i in range(AUTHORS_NUMBER):
+            author = User.objects.create_user(
+                username='author%s' % i, email='author%s@example.com' % i)
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name='Рецепт %s' % j,
+                    text='Текст',
+                    cooking_time=10,
+                )
+                for j in range(RECIPES_NUMBER)
+            )
+            Follow.objects.create(user=cls.user, author=author)
+        # bulk_create не меняет счетчики рецептов авторов.
+        call_command('recount', stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_queries_do_not_depend_on_authors(self):
+        """Количество запросов не зависит от числа авторов на странице."""
+        for recipes_limit in ('', 2):
+            with self.subTest(recipes_limit=recipes_limit):
+                self.assertQueryCountFlat(
+                    self.client, '/api/users/subscriptions/', 'limit',
+                    (1, AUTHORS_NUMBER // 2, AUTHORS_NUMBER),
+                    {'recipes_limit': recipes_limit}
+                )
+
+    def test_recipes_limit(self):
+        """recipes_limit ограничивает рецепты каждого автора."""
+        response = self.client.get(
+            '/api/users/subscriptions/',
+            {'limit': AUTHORS_NUMBER, 'recipes_limit': 2}
+        )
+        for author in response.data['results']:
+            expected = Recipe.objects.filter(
+                author_id=author['id']
+            ).values_list('id', flat=True)[:2]
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']],
+                list(expected)
+            )
+            self.assertEqual(author['recipes_count'], RECIPES_NUMBER)
+            self.assertTrue(author['is_subscribed'])
+
+    def test_without_recipes_limit(self):
+        """Без recipes_limit выводятся все рецепты автора."""
+        response = self.client.get('/api/users/subscriptions/')
+        for author in response.data['results']:
+            self.assertEqual(len(author['recipes']), RECIPES_NUMBER)
+
+
+class SubscribeTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='follower', email='follower@example.com')
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.author,
+                name='Рецепт %s' % i,
+                text='Текст',
+                cooking_time=10,
+            )
+            for i in range(RECIPES_NUMBER)
+        )
+        call_command('recount', stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/users/%s/subscribe/' % self.author.id
+
+    def test_subscribe_and_unsubscribe(self):
+        """Статус ответа зависит от того, изменилась ли подписка."""
+        # Подписка, счетчик, лента подписчика, ответ и рецепты автора.
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url + '?recipes_limit=2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.author.id)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(response.data['recipes_count'], RECIPES_NUMBER)
+        self.assertEqual(len(response.data['recipes']), 2)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        # Отписка, счетчик и два запроса к ленте подписчиков.
+        with self.assertNumQueries(4):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_self_and_missing_author(self):
+        """Подписка на себя - 400, на несуществующего автора - 404."""
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/users/%s/subscribe/' % self.user.id)
+        self.assertEqual(response.status_code, 400)
+        missing = '/api/users/%s/subscribe/' % (self.author.id + 1)
+        self.assertEqual(self.client.post(missing).status_code, 404)
+        self.assertEqual(self.client.delete(missing).status_code, 404)
+
+    def test_constraints(self):
+        """Повторная подписка и подписка на себя запрещены в базе."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for author in (self.author, self.user):
+            with self.subTest(author=author):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=self.user, author=author)
@@ -1,11 +1,66 @@
 from api.pagination import LimitPagePagination
+from django.db.models import (BooleanField, F, Prefetch, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from recipes.models import Recipe
 from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from .models import Follow, User
-from .serializers import FollowSerializer
+from .serializers import FollowSerializer, get_recipes_limit
+
+
+def get_authors_recipes(authors, limit=None):
+    """
+    Рецепты авторов, не более limit последних у каждого.
+    Ограничение считается одним запросом через
+    ROW_NUMBER() OVER (PARTITION BY author_id).
+    """
+    queryset = Recipe.objects.filter(author__in=authors)
+    if limit is None:
+        return queryset
+    ranked = queryset.annotate(row_number=Window(
+        expression=RowNumber(),
+        partition_by=[F('author_id')],
+        order_by=[F('pub_date').desc(), F('id').desc()],
+    )).order_by().values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    # Django 2.2 не умеет фильтровать по оконным функциям,
+    # поэтому отбор по номеру строки делается во вложенном запросе.
+    return queryset.extra(
+        where=[
+            '{}.id IN (SELECT ranked.id FROM ({}) AS ranked '
+            'WHERE ranked.row_number <= %s)'.format(
+                Recipe._meta.db_table, sql)
+        ],
+        params=[*params, limit],
+    )
+
+
+def get_subscriptions(request, **filters):
+    """
+    Подписки пользователя вместе с авторами одним запросом,
+    число рецептов хранится в счетчике автора.
+    """
+    return Follow.objects.filter(
+        user=request.user, **filters
+    ).select_related('author').annotate(
+        is_subscribed=Value(True, output_field=BooleanField()),
+    )
+
+
+def prefetch_recipes(follows, request):
+    """Рецепты всех авторов загружаются одним запросом."""
+    prefetch_related_objects(follows, Prefetch(
+        'author__recipes',
+        queryset=get_authors_recipes(
+            [follow.author_id for follow in follows],
+            get_recipes_limit(request)
+        )
+    ))
 
 
 class SubscriptionsView(generics.ListAPIView):
@@ -14,8 +69,8 @@ class SubscriptionsView(generics.ListAPIView):
     pagination_class = LimitPagePagination
 
     def list(self, request):
-        queryset = Follow.objects.filter(user=request.user)
-        page = self.paginate_queryset(queryset)
+        page = self.paginate_queryset(get_subscriptions(request))
+        prefetch_recipes(page, request)
         serializer = FollowSerializer(page, many=True,
                                       context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -31,30 +86,39 @@ class FollowViewSet(viewsets.ModelViewSet):
             methods=['post'],
             permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, pk):
-        user = request.user
-        author = get_object_or_404(User, id=pk)
-
-        if user == author:
+        """
+        Подписка - один INSERT ... ON CONFLICT DO NOTHING,
+        ответ строится по одному запросу с аннотациями.
+        """
+        author_id = self.get_author_id(pk)
+        if author_id == request.user.id:
             return Response({
                 'errors': 'Вы не можете подписываться на самого себя'
             }, status=status.HTTP_400_BAD_REQUEST)
-        if Follow.objects.filter(user=user, author=author).exists():
+        if not Follow.objects.follow(request.user.id, author_id):
+            get_object_or_404(User.objects.only('id'), id=author_id)
             return Response({
                 'errors': 'Вы уже подписаны на данного пользователя'
             }, status=status.HTTP_400_BAD_REQUEST)
-
-        follow = Follow.objects.get_or_create(user=user, author=author)[0]
+        follows = list(get_subscriptions(request, author_id=author_id))
+        prefetch_recipes(follows, request)
         serializer = FollowSerializer(
-            follow, context={'request': request}
+            follows[0], context={'request': request}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def subscribe_del(self, request, pk=None):
-        user = request.user
-        author = get_object_or_404(User, id=pk)
-        if not Follow.objects.filter(user=user, author=author).exists():
+        author_id = self.get_author_id(pk)
+        if not Follow.objects.unfollow(request.user.id, author_id):
+            get_object_or_404(User.objects.only('id'), id=author_id)
             return Response({'errors': 'Подписки не существует.'},
                             status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.get(user=user, author=author).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def get_author_id(pk):
+        try:
+            return int(pk)
+        except ValueError:
+            raise Http404